@@ -1,72 +1,81 @@
 import requests
-import bs4
 import re
-from xml.dom import minidom
+import sys
+from os import path
+from fcc_xml import LicenseParser, iterlicenses
+from fcc_uls import ULSDatabase, ulsfilename, showlicense
+from fcc_html import extractdetails
+from qrz_profile import profileoptions, startprofile
+#
+# --profile[=FILE] and --profile-top=N profile the lookup with cProfile
+profile = profileoptions(filename="fcc_api.prof")
+if profile is not None:
+    startprofile(*profile)
+#
+# --html=BACKEND picks the detail page extractor in fcc_html.py (scanner or soup) and --save-html=FILE keeps a copy
+# of the page, i.e. for fcc_html.py bench
+htmlBackend = 'scanner'
+htmlFile = ''
+for arg in sys.argv[1:]:
+    if arg.startswith('--html='):
+        htmlBackend = arg.split('=', 1)[1]
+    elif arg.startswith('--save-html='):
+        htmlFile = arg.split('=', 1)[1]
 #
 # Specify a callsign
 searchValue = input("Enter search value: ")
 #
+# Answer from the local ULS database (built by fcc_uls.py) when there is one, unless --online is given
+if path.exists(ulsfilename) and "--online" not in sys.argv:
+    uls = ULSDatabase(ulsfilename)
+    localLicense = uls.lookup(searchValue)
+    uls.close()
+    if localLicense is not None:
+        print(f"License found in local ULS database {ulsfilename}...\n")
+        showlicense(localLicense)
+        exit()
+#
 # Retrieve XML record from FCC API
 rooturl = 'http://data.fcc.gov/api/license-view/basicSearch/getLicenses?searchValue='
 url = rooturl + searchValue
 print("Retrieving general XML record from FCC database...")
 try:
-    fccResp = requests.get(url, timeout = 5)
+    fccResp = requests.get(url, timeout = 5, stream = True)
 except:
     if fccResp.status_code != 200:
         print(f"FCC API Error: {fccResp}")
         exit()
 #
-# Parse XML record for details
+# Parse XML record for details - every <License> is read by tag name as it arrives
 print("Parsing XML record...")
-fccRecord = minidom.parseString(fccResp.text)
-try:
-    fccRecordTree = fccRecord.getElementsByTagName('License')[0]
-except IndexError:
-    errorTree = fccRecord.getElementsByTagName('Errors')[0]
-    errorElement = errorTree.childNodes.item(0)
-    errorCode = errorElement.getAttribute('code')
-    errorMsg = errorElement.getAttribute('msg')
-    print(f"\nSearch Error Code: {errorCode}")
-    print(f"{errorMsg}\n")
+fccParser = LicenseParser()
+licenses = list(iterlicenses(fccResp.iter_content(8192), fccParser))
+if not licenses:
+    for errorCode, errorMsg in fccParser.errors:
+        print(f"\nSearch Error Code: {errorCode}")
+        print(f"{errorMsg}\n")
     exit()
-fccLicenseTree = fccRecordTree.childNodes
-try:
-    name = fccLicenseTree[0].childNodes.item(0).nodeValue
-except AttributeError:
-    name = ''
-try:
-    frn = fccLicenseTree[1].childNodes.item(0).nodeValue
-except AttributeError:
-    frn = ''
-try:
-    callSign = fccLicenseTree[2].childNodes.item(0).nodeValue
-except AttributeError:
-    callSign = ''
-try:
-    categoryDesc = fccLicenseTree[3].childNodes.item(0).nodeValue
-except AttributeError:
-    categoryDesc = ''
-try:
-    serviceDesc = fccLicenseTree[4].childNodes.item(0).nodeValue
-except AttributeError:
-    serviceDesc = ''
-try:
-    statusDesc = fccLicenseTree[5].childNodes.item(0).nodeValue
-except AttributeError:
-    statusDesc = ''
-try:
-    expDate = fccLicenseTree[6].childNodes.item(0).nodeValue
-except AttributeError:
-    expDate = ''
-try:
-    licenseID = fccLicenseTree[7].childNodes.item(0).nodeValue
-except AttributeError:
-    licenseID = ''
-try:
-    webpage = fccLicenseTree[8].childNodes.item(0).nodeValue
-except AttributeError:
-    webpage = ''
+#
+# A search can match several licenses - use the one issued to the callsign searched for, if there is one
+fccLicense = licenses[0]
+for eachLicense in licenses:
+    if eachLicense.get('callsign', '').upper() == searchValue.strip().upper():
+        fccLicense = eachLicense
+        break
+if len(licenses) > 1:
+    print(f"{len(licenses)} licenses found:")
+    for eachLicense in licenses:
+        print(f"  {eachLicense.get('callsign', ''):<10} {eachLicense.get('statusDesc', ''):<10} "
+              f"{eachLicense.get('licName', '')}")
+name = fccLicense.get('licName', '')
+frn = fccLicense.get('frn', '')
+callSign = fccLicense.get('callsign', '')
+categoryDesc = fccLicense.get('categoryDesc', '')
+serviceDesc = fccLicense.get('serviceDesc', '')
+statusDesc = fccLicense.get('statusDesc', '')
+expDate = fccLicense.get('expiredDate', '')
+licenseID = fccLicense.get('licenseID', '')
+webpage = fccLicense.get('licDetailURL', '')
 #
 # Retrieve address and license class from detailed FCC record from url in XML
 if webpage == '':
@@ -82,13 +91,15 @@ except:
         exit()
 #
 print("Parsing HTML document...")
-soup = bs4.BeautifulSoup(detailsResp.text, 'html5lib')
-licNameAddrStyle = 'body > table:nth-child(4) > tbody > tr > td:nth-child(2) > div > table:nth-child(2) > tbody > tr:nth-child(4) > td > table > tbody > tr:nth-child(3) > td:nth-child(1)'
-licTypeStyle = 'body > table:nth-child(4) > tbody > tr > td:nth-child(2) > div > table:nth-child(2) > tbody > tr:nth-child(4) > td > table > tbody > tr:nth-child(1) > td:nth-child(4)'
-licClassStyle = 'body > table:nth-child(4) > tbody > tr > td:nth-child(2) > div > table:nth-child(2) > tbody > tr:nth-child(6) > td > table > tbody > tr:nth-child(1) > td:nth-child(2)'
-licFonEmailStyle = 'body > table:nth-child(4) > tbody > tr > td:nth-child(2) > div > table:nth-child(2) > tbody > tr:nth-child(4) > td > table > tbody > tr:nth-child(3) > td:nth-child(2) > p'
+if htmlFile != '':
+    with open(htmlFile, 'w', encoding='utf-8') as pageFile:
+        pageFile.write(detailsResp.text)
+details = extractdetails(detailsResp.text, htmlBackend)
+if details['nameaddr'].strip() == '':
+    print("Licensee details not found on the detailed webpage...")
+    exit()
 #
-licNameAddr = soup.select(licNameAddrStyle)[0].text.lstrip().split('\n')
+licNameAddr = details['nameaddr'].lstrip().split('\n')
 licAddr = licNameAddr[1]
 licAddr2 = licNameAddr[2].split(', ')
 if len(licAddr2) == 2:
@@ -103,12 +114,12 @@ if len(licNameAddr) == 6:
 else:
     licAttn = ''
 #
-licType = soup.select(licTypeStyle)[0].text.strip()
+licType = details['type'].strip()
 #
-licClass = soup.select(licClassStyle)[0].text.strip()
+licClass = details['class'].strip()
 #
 fonRegEx = '\(\d{3}\)\d{3}-\d{4}'
-licFonEmail = soup.select(licFonEmailStyle)[0].text.strip().split(':')
+licFonEmail = details['fonemail'].strip().split(':')
 if len(licFonEmail) > 1:
     fonObj = re.search(fonRegEx,licFonEmail[1].strip())
     licFon = fonObj.group()
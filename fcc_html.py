@@ -0,0 +1,297 @@
+import argparse
+import json
+import sys
+import time
+from html.parser import HTMLParser
+from os import path
+
+try:
+    import bs4  # the original BeautifulSoup path - optional
+except ImportError:
+    bs4 = None
+
+# v1.01
+# Extraction of the licensee cells from the FCC ULS license detail page (licDetailURL)
+# fcc_api.py needs four cells of the page: licensee name and address, licensee type, operator class, and the phone /
+# fax / email paragraph.  Two interchangeable backends return the same text for each:
+#
+#     scanner  stdlib html.parser; follows the element path of each cell while the page streams past and keeps only
+#              the text inside those four cells - no tree is built
+#     soup     BeautifulSoup with the html5lib tree builder and the CSS selectors fcc_api.py used before (needs bs4
+#              and html5lib); "soup-html.parser" and "soup-lxml" use the other tree builders with the same selectors
+#              minus <tbody>.  html.parser does not close an unclosed <td> or <tr>, so it only finds the cells on
+#              well-formed pages.
+#
+# The scanner mimics html5lib for the parts of the page the selectors walk through: <tbody> is implied inside a
+# <table>, an unclosed <td>, <tr> or <p> is closed by the next one, and \r\n line breaks are read as \n.
+#
+#     python fcc_html.py bench saved_page1.html saved_page2.html
+#
+# fcc_license_detail.html is a detail page kept as a fixture, with the cells the original selectors return from it in
+# fcc_license_detail.json.  "check" runs a backend over the fixture pages and compares its cells with the saved ones;
+# "check --update" saves the soup backend's cells for new pages (i.e. ones kept with fcc_api.py --save-html).
+#
+#     python fcc_html.py check                       (every available backend)
+
+# CSS selectors of the cells, from <body>
+cellpaths = {
+    "nameaddr": "body > table:nth-child(4) > tbody > tr > td:nth-child(2) > div > table:nth-child(2) > tbody > "
+                "tr:nth-child(4) > td > table > tbody > tr:nth-child(3) > td:nth-child(1)",
+    "type": "body > table:nth-child(4) > tbody > tr > td:nth-child(2) > div > table:nth-child(2) > tbody > "
+            "tr:nth-child(4) > td > table > tbody > tr:nth-child(1) > td:nth-child(4)",
+    "class": "body > table:nth-child(4) > tbody > tr > td:nth-child(2) > div > table:nth-child(2) > tbody > "
+             "tr:nth-child(6) > td > table > tbody > tr:nth-child(1) > td:nth-child(2)",
+    "fonemail": "body > table:nth-child(4) > tbody > tr > td:nth-child(2) > div > table:nth-child(2) > tbody > "
+                "tr:nth-child(4) > td > table > tbody > tr:nth-child(3) > td:nth-child(2) > p",
+}
+
+# The same cells for the html.parser and lxml tree builders, which leave the rows where the page puts them instead of
+# inside html5lib's implied <tbody>
+flatpaths = {name: selector.replace(" > tbody", "") for name, selector in cellpaths.items()}
+
+# Detail pages kept as fixtures, each with its expected cells in a .json file of the same name
+fixturefilenames = ("fcc_license_detail.html",)
+
+# Elements that never have content or an end tag
+voidtags = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track",
+            "wbr"}
+
+# * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * *
+# *                                                                 *
+# *                          Functions                              *
+# *                                                                 *
+# * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * *
+
+def parsepath(selector):
+    # "table:nth-child(4) > tbody" -> (("table", 4), ("tbody", None))
+    steps = []
+    for step in selector.split(">"):
+        tag, sep, nth = step.strip().partition(":nth-child(")
+        steps.append((tag, int(nth.rstrip(")")) if sep else None))
+    return tuple(steps)
+
+
+targets = {name: parsepath(selector) for name, selector in cellpaths.items()}
+
+
+class CellScanner(HTMLParser):
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []  # open elements: [tag, position among its parent's element children, children seen so far]
+        self.root = [None, 0, 0]  # parent of <html>
+        self.body = None  # index of <body> in the stack
+        self.capturing = []  # (name, depth) of the target cells the parser is inside
+        self.cells = {name: [] for name in targets}
+        self.found = set()
+
+    def parent(self):
+        return self.stack[-1] if self.stack else self.root
+
+    def push(self, tag):
+        parent = self.parent()
+        parent[2] += 1
+        self.stack.append([tag, parent[2], 0])
+        if tag == "body" and self.body is None:
+            self.body = len(self.stack) - 1
+        if self.body is None:
+            return
+        path = self.stack[self.body:]
+        for name, target in targets.items():
+            if name in self.found or len(path) != len(target):
+                continue
+            if all(element[0] == want and (nth is None or nth == element[1])
+                   for element, (want, nth) in zip(path, target)):
+                self.capturing.append((name, len(self.stack)))
+                self.found.add(name)  # like select(...)[0], only the first match counts
+
+    def pop(self):
+        depth = len(self.stack)
+        if self.capturing:
+            self.capturing = [(name, start) for name, start in self.capturing if start < depth]
+        if depth - 1 == self.body:
+            self.body = None
+        self.stack.pop()
+
+    def tags(self):
+        return [element[0] for element in self.stack]
+
+    def closeto(self, tags, stop):
+        # Pop open elements while the innermost one is in tags, but never past one in stop
+        while self.stack and self.stack[-1][0] in tags and self.stack[-1][0] not in stop:
+            self.pop()
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("td", "th"):
+            self.closeto({"td", "th", "p", "span", "div", "font", "b", "a"}, {"table"})
+        elif tag == "tr":
+            self.closeto({"td", "th", "tr", "p", "span", "div", "font", "b", "a"}, {"table", "tbody"})
+        elif tag == "p" and self.stack and self.stack[-1][0] == "p":
+            self.pop()
+        if tag == "tr" and self.stack and self.stack[-1][0] == "table":
+            self.push("tbody")  # html5lib puts rows inside an implied <tbody>
+        self.push(tag)
+        if tag in voidtags:
+            self.pop()
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in voidtags:
+            self.pop()
+
+    def handle_endtag(self, tag):
+        if tag not in self.tags():
+            return  # stray end tag
+        # Everything still open inside the element is closed with it
+        while self.stack:
+            closed = self.stack[-1][0]
+            self.pop()
+            if closed == tag:
+                break
+
+    def handle_data(self, data):
+        for name, start in self.capturing:
+            self.cells[name].append(data)
+
+
+def scanhtml(page):
+    scanner = CellScanner()
+    # Line breaks are normalized to \n before parsing, as html5lib does
+    scanner.feed(page.replace("\r\n", "\n").replace("\r", "\n"))
+    scanner.close()
+    return {name: "".join(text) for name, text in scanner.cells.items()}
+
+
+def souphtml(page, builder="html5lib"):
+    # BeautifulSoup with the CSS selectors fcc_api.py used before (without <tbody> for the other tree builders)
+    soup = bs4.BeautifulSoup(page, builder)
+    cells = {}
+    for name, selector in (cellpaths if builder == "html5lib" else flatpaths).items():
+        found = soup.select(selector)
+        cells[name] = found[0].text if found else ""
+    return cells
+
+
+backends = {"scanner": scanhtml}
+if bs4 is not None:
+    backends["soup"] = souphtml
+    backends["soup-html.parser"] = lambda page: souphtml(page, "html.parser")
+    backends["soup-lxml"] = lambda page: souphtml(page, "lxml")
+
+
+def extractdetails(page, backend="scanner"):
+    # The four licensee cells of a ULS license detail page as {"nameaddr", "type", "class", "fonemail"} text
+    if backend not in backends:
+        raise ValueError("HTML backend {} is not available (installed: {})".format(backend, ", ".join(backends)))
+    return backends[backend](page)
+
+
+def bench(args):
+    pages = []
+    for filename in args.pages:
+        with open(filename, encoding="utf-8", errors="replace") as pagefile:
+            pages.append(pagefile.read())
+    if "soup" not in backends:
+        print("No baseline: the soup backend needs bs4 and html5lib, so there is nothing to compare the scanner with")
+        return 1
+    results = {}
+    print("{:<18} {:>12} {:>10}".format("backend", "ms/page", "speedup"))
+    for name, extract in backends.items():
+        try:
+            expected = [extract(page) for page in pages]
+        except Exception as exc:  # i.e. a tree builder that is not installed
+            print("{:<18} {}".format(name, "unavailable: " + str(exc).splitlines()[0]))
+            continue
+        best = None
+        for attempt in range(args.repeat):
+            started = time.perf_counter()
+            for page in pages:
+                extract(page)
+            elapsed = (time.perf_counter() - started) / len(pages)
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = (best, expected)
+    if not results:
+        return 1
+    if "soup" not in results:
+        print("No baseline: the soup backend failed on these pages")
+        return 1
+    baseline = results["soup"]
+    mismatches = 0
+    for name, (seconds, cells) in results.items():
+        print("{:<18} {:>12.3f} {:>9.1f}x".format(name, seconds * 1000, baseline[0] / seconds))
+        if cells != baseline[1]:
+            mismatches += 1
+            for filename, got, want in zip(args.pages, cells, baseline[1]):
+                for key in want:
+                    if got[key].strip() != want[key].strip():
+                        print("    *** {} {} {}: {!r} != {!r}".format(name, filename, key, got[key].strip()[:60],
+                                                                       want[key].strip()[:60]))
+    return 1 if mismatches else 0
+
+
+def expectedfilename(filename):
+    return path.splitext(filename)[0] + ".json"
+
+
+def check(args):
+    # Compare the cells of one backend, or of every available one, with the saved ones for every fixture page
+    pages = args.pages or [path.join(path.dirname(path.abspath(__file__)), name) for name in fixturefilenames]
+    if args.update and "soup" not in backends:
+        print("--update needs the soup backend (bs4 and html5lib) to produce the original selector results")
+        return 1
+    failures = 0
+    for filename in pages:
+        with open(filename, encoding="utf-8", errors="replace") as pagefile:
+            page = pagefile.read()
+        if args.update:
+            with open(expectedfilename(filename), 'w', encoding="utf-8") as expectedfile:
+                json.dump(souphtml(page), expectedfile, indent=2)
+                expectedfile.write("\n")
+            print("Saved the soup backend's cells to " + expectedfilename(filename))
+            continue
+        with open(expectedfilename(filename), encoding="utf-8") as expectedfile:
+            expected = json.load(expectedfile)
+        for backend in [args.backend] if args.backend else backends:
+            try:
+                cells = extractdetails(page, backend)
+            except Exception as exc:  # i.e. a tree builder that is not installed
+                if args.backend:
+                    raise
+                print("{} {}: unavailable: {}".format(backend, filename, str(exc).splitlines()[0]))
+                continue
+            different = [key for key in expected if cells.get(key) != expected[key]]
+            for key in different:
+                print("*** {} {} {}: {!r} != {!r}".format(backend, filename, key, cells.get(key), expected[key]))
+            failures += bool(different)
+            print("{} {}: {}".format(backend, filename, "differs" if different else "ok"))
+    return 1 if failures else 0
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="FCC license detail page extraction backends")
+    commands = argparser.add_subparsers(dest="command", required=True)
+    benchparser = commands.add_parser("bench", help="time every backend on saved detail pages and compare results")
+    benchparser.add_argument("pages", nargs="+", help="saved license detail pages (.html)")
+    benchparser.add_argument("--repeat", type=int, default=5, help="timed passes, best is kept (default: 5)")
+    checkparser = commands.add_parser("check", help="compare a backend's cells with the saved ones of fixture pages")
+    checkparser.add_argument("pages", nargs="*",
+                             help="detail pages with a .json of expected cells (default: the bundled fixture)")
+    checkparser.add_argument("--backend", choices=list(backends), help="backend to check (default: all available)")
+    checkparser.add_argument("--update", action="store_true",
+                             help="save the soup backend's cells as the expected ones instead of checking")
+    extractparser = commands.add_parser("extract", help="show the cells a backend finds in a saved page")
+    extractparser.add_argument("page")
+    extractparser.add_argument("--backend", default="scanner", choices=list(backends))
+    args = argparser.parse_args()
+    if args.command == "bench":
+        return bench(args)
+    if args.command == "check":
+        return check(args)
+    with open(args.page, encoding="utf-8", errors="replace") as pagefile:
+        for name, text in extractdetails(pagefile.read(), args.backend).items():
+            print("{}: {!r}".format(name, text))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
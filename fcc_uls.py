@@ -0,0 +1,388 @@
+import argparse
+import io
+import os
+import sqlite3
+import sys
+import time
+import zipfile
+from os import path
+
+# v1.01
+# Local, indexed copy of the FCC ULS amateur license database
+# The FCC publishes the whole amateur service as l_amat.zip (https://www.fcc.gov/uls/transactions/daily-weekly),
+# pipe delimited .dat files with one record per line:
+#
+#     HD.dat  license header: callsign, status, grant / expiration / cancellation dates
+#     EN.dat  entity: licensee name, address, phone, email and FRN
+#     AM.dat  amateur: operator class, previous callsign, trustee
+#     HS.dat  license history log
+#
+# Every record starts with its record type and the license's unique system identifier (USI), which is also the
+# licenseID of the License View API.  importzip() streams the files straight out of the zip into SQLite in batches,
+# so memory use does not grow with the size of the dump, and builds the indexes afterwards.  ULSDatabase then answers
+# lookups by callsign, FRN or license ID with one local query.
+# The FCC also publishes daily (l_am_mon.zip ... l_am_sun.zip) and weekly transaction files in the same format, holding
+# every record of each license that changed.  ULSDatabase.update() applies the ones in a directory that are newer than
+# the data already loaded: all rows of each license in a file are deleted and replaced by the file's records.  Files
+# are recognised by name and the date of their contents, because the daily file names are reused every week.
+#
+#     python fcc_uls.py import l_amat.zip
+#     python fcc_uls.py update downloads/
+#     python fcc_uls.py lookup W1AW
+
+ulsfilename = "fcc_uls.db"
+
+# Rows handed to SQLite per executemany()
+batchsize = 10000
+
+# Record type -> (table, [(column, field index)]) of the fields kept from each .dat file.  Field indexes are 0 based
+# positions in the FCC's public access file definitions.
+recordfields = {
+    "HD": ("licenses", [("usi", 1), ("callsign", 4), ("status", 5), ("service", 6), ("grant_date", 7),
+                        ("expired_date", 8), ("cancellation_date", 9), ("effective_date", 42),
+                        ("last_action_date", 43)]),
+    "EN": ("entities", [("usi", 1), ("callsign", 4), ("entity_type", 5), ("licensee_id", 6), ("entity_name", 7),
+                        ("first_name", 8), ("mi", 9), ("last_name", 10), ("suffix", 11), ("phone", 12), ("fax", 13),
+                        ("email", 14), ("street", 15), ("city", 16), ("state", 17), ("zip", 18), ("po_box", 19),
+                        ("attention", 20), ("frn", 22)]),
+    "AM": ("amateurs", [("usi", 1), ("callsign", 4), ("operator_class", 5), ("group_code", 6), ("region_code", 7),
+                        ("trustee_callsign", 8), ("previous_callsign", 15), ("previous_class", 16)]),
+    "HS": ("history", [("usi", 1), ("callsign", 3), ("log_date", 4), ("code", 5)]),
+}
+
+# Fewest fields a complete line of each record type has - a shorter line is a record broken by a newline in a field
+minfields = {rectype: max(index for column, index in fields) + 1 for rectype, (table, fields) in recordfields.items()}
+
+schema = (
+    "CREATE TABLE IF NOT EXISTS licenses (usi INTEGER PRIMARY KEY, callsign TEXT, status TEXT, service TEXT, "
+    "grant_date TEXT, expired_date TEXT, cancellation_date TEXT, effective_date TEXT, last_action_date TEXT)",
+    "CREATE TABLE IF NOT EXISTS entities (usi INTEGER PRIMARY KEY, callsign TEXT, entity_type TEXT, licensee_id TEXT, "
+    "entity_name TEXT, first_name TEXT, mi TEXT, last_name TEXT, suffix TEXT, phone TEXT, fax TEXT, email TEXT, "
+    "street TEXT, city TEXT, state TEXT, zip TEXT, po_box TEXT, attention TEXT, frn TEXT)",
+    "CREATE TABLE IF NOT EXISTS amateurs (usi INTEGER PRIMARY KEY, callsign TEXT, operator_class TEXT, "
+    "group_code TEXT, region_code TEXT, trustee_callsign TEXT, previous_callsign TEXT, previous_class TEXT)",
+    "CREATE TABLE IF NOT EXISTS history (usi INTEGER, callsign TEXT, log_date TEXT, code TEXT)",
+    "CREATE TABLE IF NOT EXISTS applied (filename TEXT, datadate TEXT, kind TEXT, applied TEXT, "
+    "PRIMARY KEY (filename, datadate))",
+)
+
+indexes = (
+    "CREATE INDEX IF NOT EXISTS licenses_callsign ON licenses (callsign)",
+    "CREATE INDEX IF NOT EXISTS entities_callsign ON entities (callsign)",
+    "CREATE INDEX IF NOT EXISTS entities_frn ON entities (frn)",
+    "CREATE INDEX IF NOT EXISTS amateurs_callsign ON amateurs (callsign)",
+    "CREATE INDEX IF NOT EXISTS history_usi ON history (usi)",
+)
+
+# Operator class codes in AM.dat
+operatorclasses = {"A": "Advanced", "E": "Amateur Extra", "G": "General", "N": "Novice", "P": "Technician Plus",
+                   "T": "Technician"}
+
+# License status codes in HD.dat
+licensestatus = {"A": "Active", "C": "Canceled", "E": "Expired", "L": "Pending Legal Status",
+                 "P": "Parent Station Canceled", "T": "Terminated", "X": "Term Pending"}
+
+# * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * *
+# *                                                                 *
+# *                          Functions                              *
+# *                                                                 *
+# * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * *
+
+def insertsql(rectype, verb="INSERT OR REPLACE"):
+    table, fields = recordfields[rectype]
+    return verb + " INTO " + table + " (" + ", ".join(column for column, index in fields) + ") VALUES (" + \
+        ", ".join("?" * len(fields)) + ")"
+
+
+def iterrecords(stream, malformed=None):
+    # Yield the fields of each record in a .dat file opened in binary mode.  A line that has fewer fields than its
+    # record type needs was split by a newline inside a field and is joined with the next line.
+    # A record whose USI is not a number (i.e. a truncated last line) is skipped and appended to malformed, if given.
+    text = io.TextIOWrapper(stream, encoding="latin-1", newline="")
+    pending = None
+    for line in text:
+        line = line.rstrip("\r\n")
+        if pending is not None:
+            line = pending + " " + line
+            pending = None
+        fields = line.split("|")
+        if len(fields) < minfields.get(fields[0], 0):
+            pending = line
+            continue
+        if fields[0] in recordfields:
+            if validusi(fields, malformed):
+                yield fields
+    if pending is not None:
+        fields = pending.split("|")
+        if fields[0] in recordfields and validusi(fields, malformed):
+            yield fields + [""] * (minfields[fields[0]] - len(fields))
+
+
+def validusi(fields, malformed=None):
+    # True if the record's USI (field 1) is a number that rowvalues() and apply() can convert with int()
+    if len(fields) > 1 and fields[1].strip().isdigit():
+        return True
+    if malformed is not None:
+        malformed.append("|".join(fields))
+    return False
+
+
+def reportmalformed(member, malformed, progress=print):
+    # Report the records iterrecords() skipped in member, showing the first of them
+    if malformed:
+        progress("*** Skipped {} malformed record(s) in {}, first: {!r}".format(len(malformed), member,
+                                                                              malformed[0][:60]))
+
+
+def rowvalues(fields, columns):
+    return [int(fields[index]) if column == "usi" else fields[index].strip() for column, index in columns]
+
+
+def loadrecords(db, records, verb="INSERT OR REPLACE"):
+    # Write records to their tables in batches of batchsize rows.  Returns the number of records per record type.
+    counts = {}
+    batches = {}
+    for fields in records:
+        rectype = fields[0]
+        if rectype == "EN" and fields[5] not in ("L", ""):
+            continue  # only the licensee - contact and transferee entities would replace it under the same USI
+        batch = batches.setdefault(rectype, [])
+        batch.append(rowvalues(fields, recordfields[rectype][1]))
+        if len(batch) >= batchsize:
+            db.executemany(insertsql(rectype, verb), batch)
+            counts[rectype] = counts.get(rectype, 0) + len(batch)
+            batch.clear()
+    for rectype, batch in batches.items():
+        if batch:
+            db.executemany(insertsql(rectype, verb), batch)
+            counts[rectype] = counts.get(rectype, 0) + len(batch)
+    return counts
+
+
+def zipdate(archive):
+    # Date of the newest member of a ULS zip - the day the FCC produced it, as "YYYY-MM-DD HH:MM:SS"
+    return max("%04d-%02d-%02d %02d:%02d:%02d" % info.date_time for info in archive.infolist())
+
+
+def datfiles(archive):
+    # The .dat members of a ULS zip that importzip() knows how to read, in load order
+    names = {path.basename(name).upper(): name for name in archive.namelist()}
+    return [names[rectype + ".DAT"] for rectype in recordfields if rectype + ".DAT" in names]
+
+
+def importzip(zipfilename, filename=ulsfilename, progress=print):
+    # Build a new database from a ULS full dump.  The new database is written next to filename and only replaces
+    # it once the import has finished, so lookups keep working from the old copy until then.
+    tempfilename = filename + ".new"
+    if path.exists(tempfilename):
+        os.remove(tempfilename)
+    db = sqlite3.connect(tempfilename)
+    db.execute("PRAGMA journal_mode=OFF")  # a failed import is simply thrown away
+    db.execute("PRAGMA synchronous=OFF")
+    for statement in schema:
+        db.execute(statement)
+    started = time.monotonic()
+    counts = {}
+    with zipfile.ZipFile(zipfilename) as archive:
+        datadate = zipdate(archive)
+        members = datfiles(archive)
+        if not members:
+            db.close()
+            os.remove(tempfilename)
+            raise ValueError(zipfilename + " has none of the " + ", ".join(rectype + ".dat" for rectype in recordfields)
+                             + " files")
+        for member in members:
+            malformed = []
+            with archive.open(member) as stream:
+                counts.update(loadrecords(db, iterrecords(stream, malformed), "INSERT OR REPLACE"))
+            reportmalformed(member, malformed, progress)
+            progress("Loaded {} ({:.0f}s)".format(member, time.monotonic() - started))
+    progress("Indexing...")
+    for statement in indexes:
+        db.execute(statement)
+    db.execute("INSERT OR REPLACE INTO applied (filename, datadate, kind, applied) VALUES (?, ?, 'full', ?)",
+               (path.basename(zipfilename), datadate, time.strftime("%Y-%m-%d %H:%M:%S")))
+    db.commit()
+    db.execute("PRAGMA journal_mode=WAL")
+    db.close()
+    os.replace(tempfilename, filename)
+    return counts
+
+
+class ULSDatabase:
+
+    def __init__(self, filename=ulsfilename):
+        self.db = sqlite3.connect(filename)
+        self.db.row_factory = sqlite3.Row
+        for statement in schema + indexes:
+            self.db.execute(statement)
+
+    def watermark(self):
+        # Date of the newest data loaded, full dump or transaction file, or "" for an empty database
+        return self.db.execute("SELECT coalesce(max(datadate), '') FROM applied").fetchone()[0]
+
+    def applied(self, filename, datadate):
+        return self.db.execute("SELECT 1 FROM applied WHERE filename = ? AND datadate = ?",
+                               (filename, datadate)).fetchone() is not None
+
+    def apply(self, zipfilename, progress=print):
+        # Apply one transaction file in a single transaction.  Returns the number of licenses it replaced.
+        with zipfile.ZipFile(zipfilename) as archive:
+            datadate = zipdate(archive)
+            members = datfiles(archive)
+            # First pass: the licenses this file replaces (a daily file holds thousands, not millions)
+            changed = set()
+            for member in members:
+                malformed = []
+                with archive.open(member) as stream:
+                    changed.update(int(fields[1]) for fields in iterrecords(stream, malformed))
+                reportmalformed(path.basename(zipfilename) + ":" + member, malformed, progress)
+            with self.db:
+                usis = [(usi,) for usi in changed]
+                for table, fields in recordfields.values():
+                    self.db.executemany("DELETE FROM " + table + " WHERE usi = ?", usis)
+                for member in members:
+                    with archive.open(member) as stream:
+                        loadrecords(self.db, iterrecords(stream), "INSERT OR REPLACE")
+                self.db.execute("INSERT OR REPLACE INTO applied (filename, datadate, kind, applied) "
+                                "VALUES (?, ?, 'transaction', ?)",
+                                (path.basename(zipfilename), datadate, time.strftime("%Y-%m-%d %H:%M:%S")))
+        return len(changed)
+
+    def update(self, directory, progress=print):
+        # Apply the transaction files in directory that are newer than the watermark, oldest first.
+        # Returns the names of the files applied.
+        pending = []
+        for name in os.listdir(directory):
+            if not name.lower().endswith(".zip"):
+                continue
+            zipfilename = path.join(directory, name)
+            try:
+                with zipfile.ZipFile(zipfilename) as archive:
+                    datadate = zipdate(archive)
+                    if not datfiles(archive):
+                        continue
+            except zipfile.BadZipFile:
+                progress("*** Skipping {} - not a zip file".format(name))
+                continue
+            if not self.applied(name, datadate):
+                pending.append((datadate, name, zipfilename))
+        watermark = self.watermark()
+        done = []
+        for datadate, name, zipfilename in sorted(pending):
+            if datadate < watermark:
+                progress("Skipping {} ({}) - older than the data already loaded ({})".format(name, datadate,
+                                                                                           watermark))
+                continue
+            started = time.monotonic()
+            changed = self.apply(zipfilename, progress)
+            progress("Applied {} ({}): {} licenses in {:.1f}s".format(name, datadate, changed,
+                                                                    time.monotonic() - started))
+            done.append(name)
+        return done
+
+    # Columns returned by the lookups: the license, its licensee and its amateur record
+    select = ("SELECT l.usi, l.callsign, l.status, l.service, l.grant_date, l.expired_date, l.cancellation_date, "
+              "l.effective_date, e.entity_name, e.first_name, e.mi, e.last_name, e.suffix, e.phone, e.fax, e.email, "
+              "e.street, e.city, e.state, e.zip, e.po_box, e.attention, e.frn, a.operator_class, "
+              "a.previous_callsign, a.trustee_callsign FROM licenses l LEFT JOIN entities e USING (usi) "
+              "LEFT JOIN amateurs a USING (usi) ")
+
+    # Active licenses first, then the most recently granted
+    order = " ORDER BY l.status = 'A' DESC, substr(l.grant_date, 7, 4) || substr(l.grant_date, 1, 2) || " \
+            "substr(l.grant_date, 4, 2) DESC"
+
+    def rows(self, where, value):
+        return [dict(row) for row in self.db.execute(self.select + where + self.order, (value,))]
+
+    def lookup(self, callsign):
+        # The current license for callsign (active if there is one), or None
+        rows = self.rows("WHERE l.callsign = ?", callsign.strip().upper())
+        return rows[0] if rows else None
+
+    def bycallsign(self, callsign):
+        # Every license ever issued to callsign
+        return self.rows("WHERE l.callsign = ?", callsign.strip().upper())
+
+    def byfrn(self, frn):
+        return self.rows("WHERE e.frn = ?", frn.strip())
+
+    def bylicense(self, licenseid):
+        rows = self.rows("WHERE l.usi = ?", int(licenseid))
+        return rows[0] if rows else None
+
+    def history(self, licenseid):
+        return [dict(row) for row in self.db.execute("SELECT log_date, code FROM history WHERE usi = ?",
+                                                     (int(licenseid),))]
+
+    def close(self):
+        self.db.close()
+
+
+def showlicense(row):
+    print("Callsign       : {}".format(row["callsign"]))
+    print("Name           : {}".format(row["entity_name"] or ""))
+    print("Address        : {}".format(row["street"] or row["po_box"] or ""))
+    print("City, State ZIP: {}, {} {}".format(row["city"] or "", row["state"] or "", row["zip"] or ""))
+    if row["attention"]:
+        print("                 {}".format(row["attention"]))
+    print("Email          : {}".format(row["email"] or ""))
+    print("FRN            : {}".format(row["frn"] or ""))
+    print("License ID     : {}".format(row["usi"]))
+    print("Class          : {}".format(operatorclasses.get(row["operator_class"], row["operator_class"] or "")))
+    print("Status         : {}".format(licensestatus.get(row["status"], row["status"] or "")))
+    print("Granted        : {}".format(row["grant_date"] or ""))
+    print("Expiration Date: {}".format(row["expired_date"] or ""))
+    if row["previous_callsign"]:
+        print("Previous Call  : {}".format(row["previous_callsign"]))
+    print()
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Local FCC ULS amateur license database")
+    argparser.add_argument("--db", default=ulsfilename, help="SQLite database file (default: {})".format(ulsfilename))
+    commands = argparser.add_subparsers(dest="command", required=True)
+    importparser = commands.add_parser("import", help="build the database from a ULS full dump (l_amat.zip)")
+    importparser.add_argument("zipfile")
+    updateparser = commands.add_parser("update", help="apply the daily/weekly transaction files in a directory")
+    updateparser.add_argument("directory")
+    lookupparser = commands.add_parser("lookup", help="show the licenses for a callsign, FRN or license ID")
+    lookupparser.add_argument("value")
+    lookupparser.add_argument("--frn", action="store_true", help="value is an FCC Registration Number")
+    lookupparser.add_argument("--license", action="store_true", help="value is a license ID")
+    args = argparser.parse_args()
+
+    if args.command == "import":
+        started = time.monotonic()
+        counts = importzip(args.zipfile, args.db)
+        print("Imported {} in {:.0f}s".format(", ".join("{} {}".format(count, rectype)
+                                                        for rectype, count in counts.items()),
+                                             time.monotonic() - started))
+        return 0
+
+    if not path.exists(args.db):
+        print("*** {} does not exist - import a ULS dump first".format(args.db))
+        return 1
+    uls = ULSDatabase(args.db)
+    if args.command == "update":
+        done = uls.update(args.directory)
+        print("{} transaction files applied, data current to {}".format(len(done), uls.watermark()))
+        uls.close()
+        return 0
+    if args.frn:
+        rows = uls.byfrn(args.value)
+    elif args.license:
+        rows = [row for row in [uls.bylicense(args.value)] if row]
+    else:
+        rows = uls.bycallsign(args.value)
+    uls.close()
+    if not rows:
+        print("*** Not found: " + args.value)
+        return 1
+    for row in rows:
+        showlicense(row)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+from xml.parsers import expat
+
+# v1.01
+# Streaming parser for the FCC License View API basicSearch response
+# http://data.fcc.gov/api/license-view/basicSearch/getLicenses?searchValue=... returns
+#
+#     <Response status="OK"><Licenses totalRows="2" ...>
+#         <License><licName/><frn/><callsign/><categoryDesc/><serviceDesc/><statusDesc/><expiredDate/>
+#                  <licenseID/><licDetailURL/></License> ...
+#     </Licenses></Response>
+#
+# or <Response status="FAIL"><Errors><Err code="110" msg="..."/></Errors></Response>.
+# Fields are read by tag name as each <License> closes, so a reordered or extended payload cannot shift them, and no
+# DOM of the whole response is built.
+
+# Child tags of <License>
+license_tags = ("licName", "frn", "callsign", "categoryDesc", "serviceDesc", "statusDesc", "expiredDate", "licenseID",
+                "licDetailURL")
+
+
+class LicenseParser:
+
+    def __init__(self):
+        self.status = None  # "OK" or "FAIL" from <Response status=...>
+        self.totalrows = None  # <Licenses totalRows=...>
+        self.errors = []  # (code, msg) of every <Err>
+        self.failed = False  # True if the reply was not well-formed XML
+        self.ready = []  # licenses closed since the last feed()
+        self.license = None  # fields of the <License> being read
+        self.field = None
+        self.text = []
+        self.parser = expat.ParserCreate()
+        self.parser.buffer_text = True
+        self.parser.StartElementHandler = self.start
+        self.parser.EndElementHandler = self.end
+        self.parser.CharacterDataHandler = self.data
+
+    def start(self, tag, attrs):
+        if tag == "License":
+            self.license = {}
+        elif self.license is not None:
+            self.field = tag
+            self.text = []
+        elif tag == "Response":
+            self.status = attrs.get("status")
+        elif tag == "Licenses":
+            self.totalrows = attrs.get("totalRows")
+        elif tag == "Err":
+            self.errors.append((attrs.get("code", ""), attrs.get("msg", "")))
+
+    def end(self, tag):
+        if tag == self.field:
+            self.license[tag] = "".join(self.text).strip()
+            self.field = None
+        elif tag == "License":
+            self.ready.append(self.license)
+            self.license = None
+
+    def data(self, text):
+        if self.field is not None:
+            self.text.append(text)
+
+    def feed(self, data, final=False):
+        # Parse the next chunk of bytes and return the licenses that closed while parsing it
+        if not self.failed:
+            try:
+                self.parser.Parse(data, final)
+            except expat.ExpatError:
+                self.failed = True
+        ready = self.ready
+        self.ready = []
+        return ready
+
+    def close(self):
+        return self.feed(b"", True)
+
+
+def iterlicenses(chunks, parser=None):
+    # Yield a tag -> value dictionary for every <License> in an iterable of byte chunks (i.e. iter_content()) as
+    # soon as it closes.  Pass a LicenseParser to read .errors and .status afterwards.
+    if parser is None:
+        parser = LicenseParser()
+    for data in chunks:
+        yield from parser.feed(data)
+    yield from parser.close()
@@ -0,0 +1,140 @@
+import asyncio
+import ssl
+import urllib.parse
+from qrz_http import defaultports, safechars, serverparts
+from qrz_xml import ResponseParser
+
+# v1.01
+# asyncio client for the QRZ Database XML Server
+# Counterpart to getxml() and qrzlogin() in the search scripts for programs that already run an event loop.
+# Lookups share keep-alive connections and are parsed with the same ResponseParser as the scripts, so the
+# .session and .callsign dictionaries are identical for sync and async callers.  https:// URLs are sent over TLS.
+#
+#     async with QRZClient() as client:
+#         await client.login(username, password)
+#         responses = await asyncio.gather(*(client.lookup(call) for call in calls))
+
+loginxmlurl = 'http://xmldata.qrz.com/xml/'
+
+# Bytes read from the socket per parser feed
+chunksize = 8192
+
+
+class QRZClient:
+
+    def __init__(self, baseurl=loginxmlurl, maxconnections=8, timeout=15):
+        self.baseurl = baseurl
+        self.scheme, self.host, self.port = serverparts(baseurl)
+        self.hostheader = self.host if self.port == defaultports[self.scheme] else self.host + ":" + str(self.port)
+        self.context = ssl.create_default_context() if self.scheme == "https" else None
+        self.timeout = timeout  # seconds allowed for each request
+        self.key = ""  # session key from the last response that carried one
+        self.idle = []  # (reader, writer) pairs of open keep-alive connections
+        self.slots = asyncio.Semaphore(maxconnections)  # most requests in flight at once
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        idle = self.idle
+        self.idle = []
+        for reader, writer in idle:
+            writer.close()
+        for reader, writer in idle:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def login(self, username, password):
+        # SECURITY WARNING!!! The XML server only accepts the password in PLAIN TEXT over http
+        response = await self.getxml(self.baseurl + "?username=" + username + ";password=" + password)
+        if "Key" not in response.session:
+            raise RuntimeError("No Session Key returned: " + response.session.get("Error", "no response"))
+        return response
+
+    async def lookup(self, callsign):
+        return await self.getxml(self.baseurl + "current/?s=" + self.key + ";callsign=" + callsign)
+
+    async def getxml(self, url):
+        # Send a GET for url and return the ResponseParser holding the parsed <Session> and <Callsign> elements
+        parts = urllib.parse.urlsplit(url)
+        selector = urllib.parse.quote(parts.path or "/", safe=safechars)
+        if parts.query:
+            selector += "?" + urllib.parse.quote(parts.query, safe=safechars)
+        request = ("GET " + selector + " HTTP/1.1\r\nHost: " + self.hostheader + "\r\nConnection: keep-alive\r\n\r\n")
+
+        async with self.slots:
+            response = await asyncio.wait_for(self.send(request.encode("ascii")), self.timeout)
+        if "Key" in response.session:
+            self.key = response.session["Key"]
+        return response
+
+    async def send(self, request):
+        if self.idle:
+            reader, writer = self.idle.pop()
+            try:
+                return await self.exchange(reader, writer, request)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()  # The server dropped the idle connection - retry once on a new one
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.context)
+        return await self.exchange(reader, writer, request)
+
+    async def exchange(self, reader, writer, request):
+        try:
+            writer.write(request)
+            await writer.drain()
+
+            statusline = await reader.readline()
+            if not statusline:
+                raise ConnectionResetError("connection closed by server")
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, sep, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            parser = ResponseParser()
+            parser.status = int(statusline.split()[1])
+            if headers.get("transfer-encoding", "").lower() == "chunked":
+                await self.readchunked(reader, parser)
+            elif "content-length" in headers:
+                remaining = int(headers["content-length"])
+                while remaining > 0:
+                    data = await reader.read(min(chunksize, remaining))
+                    if not data:
+                        raise asyncio.IncompleteReadError(b"", remaining)
+                    remaining -= len(data)
+                    parser.feed(data)
+            else:
+                headers["connection"] = "close"  # body ends when the server closes the connection
+                while True:
+                    data = await reader.read(chunksize)
+                    if not data:
+                        break
+                    parser.feed(data)
+            parser.close()
+        except BaseException:
+            writer.close()
+            raise
+
+        if headers.get("connection", "").lower() == "close":
+            writer.close()
+        else:
+            self.idle.append((reader, writer))
+        return parser
+
+    async def readchunked(self, reader, parser):
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass  # skip trailers
+                return
+            parser.feed(await reader.readexactly(size))
+            await reader.readexactly(2)  # CRLF after each chunk
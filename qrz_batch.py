@@ -0,0 +1,175 @@
+import datetime
+import re
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from os import path
+
+# v1.01
+# Batch lookup helpers for the _callsigns.txt email extractor
+
+# Journal status values.  Callsigns that are done or not found are skipped when a batch is restarted;
+# callsigns that hit an error are tried again.
+done = "done"
+notfound = "notfound"
+failed = "error"
+completed = (done, notfound)
+
+# Operating suffixes that do not change whose record a callsign belongs to: portable, mobile, maritime and
+# aeronautical mobile, QRP and alternate location.  W1AW/P and W1AW/QRP are both looked up as W1AW.
+# Location prefixes (VE3/W1AW) and call area suffixes (W1AW/4) are kept because they can name another record.
+portablesuffixes = ("P", "M", "MM", "AM", "QRP", "A")
+callsignpattern = re.compile(r"[A-Z0-9/]+")
+
+# Slashed zeros typed or pasted from logging software (i.e. WØABC) are the digit 0 in a callsign
+slashedzeros = str.maketrans({"Ø": "0", "ø": "0", "∅": "0"})
+
+# * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * *
+# *                                                                 *
+# *                          Functions                              *
+# *                                                                 *
+# * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * *
+
+def normalizecallsign(callsign):
+    # Canonical form of one line of _callsigns.txt: its first whitespace separated word, upper case, and no portable
+    # suffix.  Returns "" for a blank line and None when the word is not made of letters, digits and "/" - a line
+    # such as "W1AW,K1ABC" is reported rather than run together into one made-up callsign.
+    words = callsign.translate(slashedzeros).upper().split()
+    if not words:
+        return ""
+    if not callsignpattern.fullmatch(words[0]):
+        return None
+    parts = words[0].strip("/").split("/")
+    while len(parts) > 1 and parts[-1] in portablesuffixes:
+        parts.pop()
+    return "/".join(parts)
+
+
+def dedupcallsigns(lines):
+    # Normalize every line and drop repeats, keeping the first occurrence of each callsign in its original place.
+    # Returns (callsigns, blanks, duplicates, variants, invalid): the lookup list, the number of blank lines, the
+    # number of exact repeats, a canonical callsign -> [raw spellings] dictionary of the entries that were merged
+    # with it and the lines that are not a callsign.
+    callsigns = []
+    seen = {}  # canonical callsign -> the spelling it was first seen as
+    blanks = 0
+    duplicates = 0
+    variants = {}
+    invalid = []
+    for line in lines:
+        raw = line.strip()
+        callsign = normalizecallsign(raw)
+        if callsign is None:
+            invalid.append(raw)
+        elif not callsign:
+            blanks += 1
+        elif callsign not in seen:
+            seen[callsign] = raw
+            callsigns.append(callsign)
+        elif raw == seen[callsign]:
+            duplicates += 1
+        else:
+            variants.setdefault(callsign, []).append(raw)
+    return callsigns, blanks, duplicates, variants, invalid
+
+
+def orderedmap(function, items, workers=1, window=None):
+    # Call function(item) for every item with up to `workers` calls in flight and yield (item, result) pairs
+    # in input order.  Results that finish early wait in a reorder buffer until every earlier item has been
+    # yielded.  `window` caps how far the fastest worker may run ahead of the oldest unfinished item, which keeps
+    # the buffer bounded when one lookup stalls.  An exception raised by function is re-raised by the generator
+    # when its item comes up in order.
+    if workers <= 1:
+        for item in items:
+            yield item, function(item)
+        return
+
+    if window is None:
+        window = workers * 4
+
+    items = iter(items)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    inflight = {}  # future -> input position
+    finished = {}  # input position -> completed future waiting to be yielded in order
+    submitted = 0  # number of items handed to the executor
+    nextindex = 0  # input position of the next result to yield
+    exhausted = False
+    try:
+        while True:
+            # Keep the pool busy without letting the reorder buffer grow past the window
+            while not exhausted and len(inflight) < workers and submitted - nextindex < window:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                future = executor.submit(function, item)
+                future.item = item
+                inflight[future] = submitted
+                submitted += 1
+
+            while nextindex in finished:
+                future = finished.pop(nextindex)
+                nextindex += 1
+                yield future.item, future.result()
+
+            if not inflight:
+                if exhausted:
+                    return
+                continue
+
+            done, notdone = wait(inflight, return_when=FIRST_COMPLETED)
+            for future in done:
+                finished[inflight.pop(future)] = future
+    finally:
+        # Stop handing out work if the caller breaks out of the loop, exits or hits an error
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+class Journal:
+    # Append-only checkpoint journal of a batch run.  Each processed callsign is written as one tab separated line:
+    #     CALLSIGN<tab>status<tab>timestamp
+    # The last line for a callsign wins, so a callsign that failed and later succeeded counts as done.  Lines are
+    # held until flush(), which the extractor calls right after its buffered CSV rows are written, so the journal
+    # never marks a callsign done whose row was lost in a crash.
+
+    def __init__(self, filename, onrecord=None):
+        self.filename = filename
+        self.onrecord = onrecord  # called with the status of every record(), i.e. to count completed lookups
+        self.status = {}  # callsign -> last recorded status
+        if path.exists(filename):
+            with open(filename, 'r', encoding='utf-8') as journalfile:
+                for line in journalfile:
+                    fields = line.rstrip("\n").split("\t")
+                    if len(fields) >= 2 and fields[0]:
+                        self.status[fields[0]] = fields[1]
+        self.pending = []  # lines recorded since the last flush()
+        self.file = open(filename, 'a', encoding='utf-8')
+
+    def completed(self, callsign):
+        return self.status.get(callsign.strip().upper()) in completed
+
+    def record(self, callsign, status):
+        callsign = callsign.strip().upper()
+        self.status[callsign] = status
+        self.pending.append(callsign + "\t" + status + "\t" + datetime.datetime.now().isoformat(timespec="seconds")
+                            + "\n")
+        if self.onrecord is not None:
+            self.onrecord(status)
+
+    def flush(self):
+        if self.file.closed:
+            return
+        if self.pending:
+            self.file.write("".join(self.pending))
+            self.pending = []
+        self.file.flush()
+
+    def restart(self):
+        # Forget every recorded callsign so the whole list is processed again
+        self.file.close()
+        self.status = {}
+        self.pending = []
+        self.file = open(self.filename, 'w', encoding='utf-8')
+
+    def close(self):
+        self.flush()
+        self.file.close()
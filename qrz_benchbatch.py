@@ -0,0 +1,190 @@
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from os import path
+import qrz_batch
+
+try:
+    import resource  # peak RSS and CPU time of the extractor - not available on Windows
+except ImportError:
+    resource = None
+
+# v1.01
+# End-to-end throughput benchmark of the email extractor
+# Runs qrz_database_xml_server_search_extract_email_1-01.py itself, unattended (--output jsonl, --username and
+# QRZ_PASSWORD), in a fresh temporary directory with a generated _callsigns.txt, against qrz_mockserver.py (started on
+# a free local port) or any --server, for each worker count in --workers.  So every run goes through the whole
+# pipeline: dedup, journal, SQLite and memory caches, rate limiter, session manager, output sink, the email filter and
+# the buffered CSV writer.  Every worker count runs from a fresh process so the extractor's peak RSS and CPU time are
+# its own.
+# Reports lookups/s over the whole run (interpreter start-up included), p50/p95/p99 request latency from the
+# extractor's --metrics-file (the last 1000 requests), peak RSS and CPU milliseconds per record.
+#
+#     python qrz_benchbatch.py --count 2000 --latency 0.05 --jitter 0.05 --workers 1,2,4,8,16,32
+
+extractorfilename = "qrz_database_xml_server_search_extract_email_1-01.py"
+
+# * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * *
+# *                                                                 *
+# *                          Functions                              *
+# *                                                                 *
+# * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * *
+
+def childusage():
+    # (peak RSS in bytes, CPU seconds) of the finished child processes, or (None, None) if the platform cannot tell
+    if resource is None:
+        return None, None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    peak = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024  # kilobytes on Linux
+    return peak, usage.ru_utime + usage.ru_stime
+
+
+def callsigns(count, seed=1):
+    rng = random.Random(seed)
+    return [rng.choice(("W", "K", "N", "VE", "G", "DL", "JA")) + str(rng.randint(0, 9))
+            + "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for letter in range(3)) for number in range(count)]
+
+
+def readmetrics(filename):
+    # Request latency quantiles (seconds) from a Prometheus textfile written by the extractor
+    quantiles = {}
+    if path.exists(filename):
+        with open(filename) as metricsfile:
+            for line in metricsfile:
+                match = re.match(r'qrz_request_seconds\{quantile="([\d.]+)"\} ([\d.]+)', line)
+                if match:
+                    quantiles[float(match.group(1))] = float(match.group(2))
+    return quantiles
+
+
+def batch(server, workers, count, rate=0, seed=1):
+    # One timed run of the extractor in a scratch directory.  Returns a result dictionary.
+    extractor = path.join(path.dirname(path.abspath(__file__)), extractorfilename)
+    workdir = tempfile.mkdtemp(prefix="qrz_benchbatch_")
+    try:
+        with open(path.join(workdir, "_callsigns.txt"), 'w') as callsfile:
+            callsfile.write("\n".join(callsigns(count, seed)) + "\n")
+        metricsfilename = path.join(workdir, "metrics.prom")
+        command = [sys.executable, extractor, "--output", "jsonl", "--workers", str(workers), "--rate", str(rate),
+                   "--server", server, "--username", "bench", "--metrics-file", metricsfilename,
+                   "--metrics-interval", "3600"]
+        environment = dict(os.environ, QRZ_PASSWORD="bench")
+        started = time.perf_counter()
+        run = subprocess.run(command, cwd=workdir, env=environment, stdin=subprocess.DEVNULL,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding="utf-8")
+        elapsed = time.perf_counter() - started
+        peak, cpu = childusage()
+
+        records = [json.loads(line) for line in run.stdout.splitlines() if line.startswith("{")]
+        statuses = [record["status"] for record in records]
+        logins = re.search(r"Logged in to .* (\d+) times", run.stderr)
+        backoffs = re.search(r"Backed off (\d+) times", run.stderr)
+        latency = readmetrics(metricsfilename)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    # A run that ends on an error has written that lookup with the failed status; one that died without writing it
+    # still counts as an error
+    failures = statuses.count(qrz_batch.failed)
+    return {"workers": workers, "lookups": len(records), "found": statuses.count(qrz_batch.done),
+            "notfound": statuses.count(qrz_batch.notfound), "errors": max(failures, int(run.returncode != 0)),
+            "saved": sum(record["saved"] for record in records), "exitcode": run.returncode,
+            "seconds": elapsed, "lookups_per_s": len(records) / elapsed,
+            "p50_ms": latency.get(0.5, 0.0) * 1000, "p95_ms": latency.get(0.95, 0.0) * 1000,
+            "p99_ms": latency.get(0.99, 0.0) * 1000, "peak_rss": peak,
+            "cpu_ms_per_record": None if cpu is None else cpu / max(1, len(records)) * 1000,
+            "logins": int(logins.group(1)) if logins else 0, "backoffs": int(backoffs.group(1)) if backoffs else 0}
+
+
+def freeport():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def startmock(args):
+    # Start qrz_mockserver.py in its own process and wait until it accepts connections
+    port = freeport()
+    command = [sys.executable, path.join(path.dirname(path.abspath(__file__)), "qrz_mockserver.py"),
+               "--port", str(port), "--latency", str(args.latency), "--jitter", str(args.jitter),
+               "--error-rate", str(args.error_rate), "--timeout-rate", str(args.timeout_rate), "--seed", "1"]
+    mock = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    for attempt in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), 0.1).close()
+            return mock, "http://127.0.0.1:" + str(port) + "/xml/"
+        except OSError:
+            time.sleep(0.05)
+    mock.terminate()
+    raise RuntimeError("qrz_mockserver.py did not start")
+
+
+def sweep(args):
+    mock = None
+    server = args.server
+    if server is None:
+        mock, server = startmock(args)
+    results = []
+    try:
+        print("{:>7} {:>10} {:>9} {:>9} {:>9} {:>10} {:>11} {:>7}".format(
+            "workers", "lookups/s", "p50 ms", "p95 ms", "p99 ms", "peak RSS", "CPU ms/rec", "errors"))
+        for workers in args.workers:
+            # A fresh interpreter per worker count has only that run's extractor among its children, so the peak RSS
+            # and CPU time it reads for them are that run's alone
+            output = subprocess.run([sys.executable, path.abspath(__file__), "--single", str(workers),
+                                     "--server", server, "--count", str(args.count), "--rate", str(args.rate)],
+                                    stdout=subprocess.PIPE, check=True, text=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            results.append(result)
+            rss = "n/a" if result["peak_rss"] is None else "{:.1f} MB".format(result["peak_rss"] / 1e6)
+            cpu = "n/a" if result["cpu_ms_per_record"] is None else "{:.3f}".format(result["cpu_ms_per_record"])
+            print("{:>7} {:>10,.1f} {:>9.1f} {:>9.1f} {:>9.1f} {:>10} {:>11} {:>7}".format(
+                workers, result["lookups_per_s"], result["p50_ms"], result["p95_ms"], result["p99_ms"], rss, cpu,
+                result["errors"]))
+    finally:
+        if mock is not None:
+            mock.terminate()
+            mock.wait()
+
+    if args.save:
+        with open(args.save, 'w') as savefile:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                       "server": "mock" if mock is not None else server, "latency": args.latency,
+                       "jitter": args.jitter, "results": results}, savefile, indent=2)
+        print("Results saved to " + args.save)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Measure the email extractor's throughput against a mock QRZ "
+                                                    "server")
+    argparser.add_argument("--count", type=int, default=1000, help="lookups per run (default: 1000)")
+    argparser.add_argument("--workers", default="1,2,4,8,16",
+                           help="comma separated worker counts to sweep (default: 1,2,4,8,16)")
+    argparser.add_argument("--rate", type=float, default=0, help="rate limit in lookups/s, 0 for none (default: 0)")
+    argparser.add_argument("--server", help="XML server URL (default: start qrz_mockserver.py)")
+    argparser.add_argument("--latency", type=float, default=0.05, help="mock server latency (default: 0.05)")
+    argparser.add_argument("--jitter", type=float, default=0.02, help="mock server jitter (default: 0.02)")
+    argparser.add_argument("--error-rate", type=float, default=0.0, help="mock server HTTP 503 rate")
+    argparser.add_argument("--timeout-rate", type=float, default=0.0, help="mock server session timeout rate")
+    argparser.add_argument("--save", help="write the results to this JSON file")
+    argparser.add_argument("--single", type=int, help=argparse.SUPPRESS)  # one run with this many workers
+    args = argparser.parse_args()
+
+    if args.single is not None:
+        print(json.dumps(batch(args.server, args.single, args.count, args.rate)))
+        return
+    args.workers = [int(workers) for workers in args.workers.split(",")]
+    sweep(args)
+
+
+if __name__ == "__main__":
+    main()
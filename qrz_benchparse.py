@@ -0,0 +1,250 @@
+import argparse
+import html
+import io
+import json
+import platform
+import random
+import re
+import sys
+import time
+import tracemalloc
+from qrz_mockserver import mockrecord, mockresponse
+from qrz_xml import qrz_tags, session_tags, readresponse, ResponseParser
+
+# v1.01
+# Parser micro-benchmark over a synthetic corpus of QRZ responses
+# Builds a corpus of XML responses with qrz_mockserver.mockrecord() - complete records, records with fields missing,
+# non-ASCII names and markup that has to be unescaped, "Not found" and "Session Timeout" errors and login replies - and
+# times each parser over it.  Results are reported as records per second and bytes allocated per record, and can be
+# saved as a JSON baseline to compare the next parser change against.
+#
+#     python qrz_benchparse.py run --save before.json
+#     python qrz_benchparse.py run --save after.json
+#     python qrz_benchparse.py compare before.json after.json
+
+# Matches a single XML tag: group 1 is "/" for a closing tag, group 2 is the tag name and group 3 is "/" for an
+# empty element such as <aliases/>.  Processing instructions (<?xml ... ?>) never match.
+tagpattern = re.compile(r'<(/?)([A-Za-z_][\w.-]*)[^>]*?(/?)>')
+
+# * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * *
+# *                                                                 *
+# *                          Functions                              *
+# *                                                                 *
+# * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * *
+
+def parsexml(tag, xml):
+    # The original per-tag scan from the v1.01 search scripts: two str.find() calls over the whole response
+    startidx = xml.find('<' + tag) + len('<' + tag)
+    endidx = xml.find('</' + tag)
+    return startidx, endidx
+
+
+def legacyparse(data):
+    # parsexml()-style extraction as the scripts did it: str() of the response bytes, then one membership test and
+    # one parsexml() call per tag
+    xml = str(data)
+    session = {}
+    callsign = {}
+    for tag in session_tags:
+        if "<" + tag + ">" in xml:
+            startidx, endidx = parsexml(tag + ">", xml)
+            session[tag] = xml[startidx:endidx]
+    for tag in qrz_tags:
+        if "<" + tag + ">" in xml:
+            startidx, endidx = parsexml(tag + ">", xml)
+            callsign[tag] = xml[startidx:endidx]
+    return session, callsign
+
+
+def parseresponse(xml):
+    # Single-pass regex tokenizer the scripts used before ResponseParser, kept here as a contender.
+    # Walks the XML response once and returns the children of <Session> and <Callsign> as two dictionaries
+    # keyed by tag name.  Tags that are not returned by the server are simply missing from the dictionaries.
+    session = {}
+    callsign = {}
+    section = None  # dictionary of the <Session> or <Callsign> element currently open
+    field = None  # child tag currently open inside section
+    start = 0  # index of the first character of the open child's contents
+
+    for match in tagpattern.finditer(xml):
+        closing, tag, empty = match.groups()
+        if closing:
+            if tag == field:
+                value = xml[start:match.start()]
+                if "&" in value:
+                    value = html.unescape(value)
+                section[field] = value
+                field = None
+            elif tag == "Session" or tag == "Callsign":
+                section = None
+        elif tag == "Session":
+            section = session
+        elif tag == "Callsign":
+            section = callsign
+        elif section is not None:
+            if empty:
+                section[tag] = ""
+            else:
+                field = tag
+                start = match.end()
+
+    return session, callsign
+
+
+def regexparse(data):
+    return parseresponse(data.decode("utf-8"))
+
+
+def expatparse(data):
+    parser = ResponseParser()
+    parser.feed(data, True)
+    return parser.session, parser.callsign
+
+
+def streamparse(data):
+    # readresponse() as fetch() uses it, reading the body in chunks from a file-like object
+    parser = readresponse(io.BytesIO(data))
+    return parser.session, parser.callsign
+
+
+def recordparse(data):
+    parser = ResponseParser()
+    parser.feed(data, True)
+    return parser.session, parser.record()
+
+
+# Parsers timed by run, in report order
+parsers = {
+    "parsexml": legacyparse,
+    "parseresponse": regexparse,
+    "ResponseParser": expatparse,
+    "readresponse": streamparse,
+    "QRZRecord": recordparse,
+}
+
+
+def makecorpus(count=5000, seed=1):
+    # Return a list of response documents (bytes) and a description of the mix
+    rng = random.Random(seed)
+    corpus = []
+    kinds = {"full": 0, "partial": 0, "markup": 0, "notfound": 0, "timeout": 0, "login": 0}
+    for number in range(count):
+        callsign = rng.choice(("W", "K", "N", "VE", "G", "DL", "JA")) + str(rng.randint(0, 9)) + \
+            "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for letter in range(rng.randint(1, 3)))
+        session = {"Key": "%032x" % rng.getrandbits(128), "Count": str(number), "SubExp": "Wed Jan 1 12:34:03 2031",
+                   "GMTime": "Sun Oct 11 12:34:56 2026", "Remark": "cpu: %.3fs" % rng.uniform(0.005, 0.04)}
+        roll = rng.random()
+        if roll < 0.30:
+            kind, record = "full", mockrecord(callsign, rng, missing=0.0)
+        elif roll < 0.75:
+            kind, record = "partial", mockrecord(callsign, rng, missing=0.4)
+        elif roll < 0.85:
+            kind, record = "markup", mockrecord(callsign, rng, missing=0.1)
+            record["name"] = "O'Brien & Søn <Jr>"
+            record["qslmgr"] = "via bureau & direct \"QSL\""
+        elif roll < 0.93:
+            kind, record = "notfound", None
+            session["Error"] = "Not found: " + callsign
+        elif roll < 0.97:
+            kind, record = "timeout", None
+            session = {"Error": "Session Timeout", "GMTime": session["GMTime"]}
+        else:
+            kind, record = "login", None
+        kinds[kind] += 1
+        corpus.append(mockresponse(session, record))
+    return corpus, kinds
+
+
+def timeparser(parse, corpus, repeat=5):
+    # Best wall time of `repeat` passes over the corpus, and the bytes allocated per record while the parsed
+    # results of one pass are kept (the peak reported by tracemalloc)
+    best = None
+    for attempt in range(repeat):
+        started = time.perf_counter()
+        for data in corpus:
+            parse(data)
+        elapsed = time.perf_counter() - started
+        if best is None or elapsed < best:
+            best = elapsed
+
+    tracemalloc.start()
+    results = [parse(data) for data in corpus]
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del results
+    return {"seconds": best, "records_per_s": len(corpus) / best, "bytes_per_record": peak / len(corpus)}
+
+
+def run(args):
+    corpus, kinds = makecorpus(args.count, args.seed)
+    size = sum(map(len, corpus))
+    print("Corpus: {} responses, {} bytes ({})".format(len(corpus), size,
+                                                      ", ".join(k + " " + str(n) for k, n in kinds.items())))
+    names = args.parser or list(parsers)
+    results = {}
+    print("{:<16} {:>12} {:>10} {:>14}".format("parser", "records/s", "MB/s", "bytes/record"))
+    for name in names:
+        result = results[name] = timeparser(parsers[name], corpus, args.repeat)
+        print("{:<16} {:>12,.0f} {:>10.1f} {:>14,.0f}".format(name, result["records_per_s"],
+                                                             size / result["seconds"] / 1e6,
+                                                             result["bytes_per_record"]))
+    if args.save:
+        baseline = {"python": platform.python_version(), "machine": platform.machine(),
+                    "corpus": {"count": len(corpus), "seed": args.seed, "bytes": size, "kinds": kinds},
+                    "repeat": args.repeat, "results": results}
+        with open(args.save, 'w') as savefile:
+            json.dump(baseline, savefile, indent=2)
+        print("Baseline saved to " + args.save)
+    return 0
+
+
+def compare(args):
+    # Print new/old for every parser in both files; exit status 1 if any got slower or bigger than threshold allows
+    with open(args.old) as oldfile:
+        old = json.load(oldfile)
+    with open(args.new) as newfile:
+        new = json.load(newfile)
+    if old["corpus"] != new["corpus"]:
+        print("*** Warning: the two baselines were measured on different corpora")
+    regressions = 0
+    print("{:<16} {:>12} {:>12} {:>8} {:>14} {:>14} {:>8}".format("parser", "old rec/s", "new rec/s", "speed",
+                                                                 "old B/rec", "new B/rec", "memory"))
+    for name, oldresult in old["results"].items():
+        newresult = new["results"].get(name)
+        if newresult is None:
+            continue
+        speed = newresult["records_per_s"] / oldresult["records_per_s"]
+        memory = newresult["bytes_per_record"] / oldresult["bytes_per_record"]
+        flag = ""
+        if speed < 1 - args.threshold or memory > 1 + args.threshold:
+            flag = "  *** regression"
+            regressions += 1
+        print("{:<16} {:>12,.0f} {:>12,.0f} {:>7.2f}x {:>14,.0f} {:>14,.0f} {:>7.2f}x{}".format(
+            name, oldresult["records_per_s"], newresult["records_per_s"], speed, oldresult["bytes_per_record"],
+            newresult["bytes_per_record"], memory, flag))
+    return 1 if regressions else 0
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Benchmark the QRZ response parsers on a synthetic corpus")
+    commands = argparser.add_subparsers(dest="command", required=True)
+    runparser = commands.add_parser("run", help="time the parsers")
+    runparser.add_argument("--count", type=int, default=5000, help="responses in the corpus (default: 5000)")
+    runparser.add_argument("--seed", type=int, default=1, help="corpus random seed (default: 1)")
+    runparser.add_argument("--repeat", type=int, default=5, help="timed passes per parser, best is kept (default: 5)")
+    runparser.add_argument("--parser", action="append", choices=list(parsers), help="only time this parser")
+    runparser.add_argument("--save", help="write the results to this JSON baseline file")
+    compareparser = commands.add_parser("compare", help="compare two JSON baselines")
+    compareparser.add_argument("old")
+    compareparser.add_argument("new")
+    compareparser.add_argument("--threshold", type=float, default=0.10,
+                               help="allowed slowdown or memory growth before a regression is reported "
+                                    "(default: 0.10)")
+    args = argparser.parse_args()
+    if args.command == "run":
+        return run(args)
+    return compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
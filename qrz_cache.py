@@ -0,0 +1,150 @@
+import sqlite3
+from collections import OrderedDict
+from concurrent.futures import Future
+import threading
+import time
+from qrz_xml import qrz_tags, cachedresponse
+
+# v1.01
+# Local SQLite cache of QRZ callsign records
+# Records are stored under the callsign that was searched for, with all qrz_tags fields, the time they were fetched
+# and the record's moddate/serial.  A record is served locally until it is older than ttl seconds.  When an expired
+# record is fetched again and QRZ reports the same moddate and serial, only its fetch time is refreshed.
+# Every record also adds its <call>, <xref> and <aliases> to the aliases table, so a portable or vanity callsign of an
+# operator whose record is already cached is answered locally without a lookup.
+
+cachefilename = "qrz_cache.db"
+
+# Column names are quoted because "class" and "user" are SQL keywords in some dialects
+columns = ", ".join('"' + tag + '"' for tag in qrz_tags)
+
+
+def aliases(fields):
+    # Every callsign that resolves to this <Callsign> record: <call>, <xref> and the comma separated <aliases>
+    names = [fields.get("call", ""), fields.get("xref", "")] + fields.get("aliases", "").split(",")
+    return {name.strip().upper() for name in names if name.strip()}
+
+
+class CallsignCache:
+
+    def __init__(self, filename=cachefilename, ttl=7 * 86400):
+        self.ttl = ttl  # seconds a record is served locally before it is fetched again
+        self.hits = 0
+        self.misses = 0
+        self.aliashits = 0  # hits answered through the aliases table
+        self.lock = threading.Lock()  # lookups run on worker threads
+        self.db = sqlite3.connect(filename, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute('CREATE TABLE IF NOT EXISTS callsigns (query TEXT PRIMARY KEY, fetched REAL, '
+                        + ", ".join('"' + tag + '" TEXT' for tag in qrz_tags) + ')')
+        self.db.execute("CREATE TABLE IF NOT EXISTS aliases (alias TEXT PRIMARY KEY, query TEXT)")
+        self.db.commit()
+
+    def get(self, callsign):
+        # Return the cached <Callsign> fields for callsign, or None if it is not cached or has expired
+        callsign = callsign.strip().upper()
+        with self.lock:
+            row = self.db.execute("SELECT fetched, " + columns + " FROM callsigns WHERE query = ?",
+                                  (callsign,)).fetchone()
+            alias = row is None
+            if alias:
+                # Not searched for before - it may be an alias of a record that was
+                row = self.db.execute("SELECT fetched, " + columns + " FROM aliases JOIN callsigns USING (query) "
+                                      "WHERE alias = ?", (callsign,)).fetchone()
+            if row is None or time.time() - row[0] > self.ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if alias:
+                self.aliashits += 1
+        fields = {tag: value for tag, value in zip(qrz_tags, row[1:]) if value is not None}
+        if alias and callsign != fields.get("call"):
+            fields["xref"] = callsign  # as the server would report it
+        return fields
+
+    def put(self, callsign, fields):
+        # Store the <Callsign> fields returned for callsign
+        query = callsign.strip().upper()
+        with self.lock:
+            row = self.db.execute('SELECT moddate, serial FROM callsigns WHERE query = ?', (query,)).fetchone()
+            if row is not None and fields.get("moddate") and row == (fields.get("moddate"), fields.get("serial")):
+                # Unchanged on the server - just mark it fresh again.  Without a moddate there is nothing to tell an
+                # unchanged record by, so the fields are always rewritten.
+                self.db.execute("UPDATE callsigns SET fetched = ? WHERE query = ?", (time.time(), query))
+            else:
+                self.db.execute("INSERT OR REPLACE INTO callsigns (query, fetched, " + columns + ") VALUES (?, ?"
+                                + ", ?" * len(qrz_tags) + ")",
+                                [query, time.time()] + [fields.get(tag) for tag in qrz_tags])
+            self.db.executemany("INSERT OR REPLACE INTO aliases (alias, query) VALUES (?, ?)",
+                                [(alias, query) for alias in aliases(fields) if alias != query])
+            self.db.commit()
+
+    def response(self, callsign):
+        # Return a ResponseParser filled in from the cache (with .cached set) or None on a cache miss
+        fields = self.get(callsign)
+        if fields is None:
+            return None
+        return cachedresponse(fields)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class MemoryCache:
+    # Bounded in-process LRU cache with single-flight coalescing.  The first caller to ask for a key runs fetch(key);
+    # anyone asking for the same key while that fetch is in flight waits for its result instead of sending their own
+    # request.  Entries are evicted when there are more than maxsize of them or they are older than ttl seconds.
+
+    def __init__(self, maxsize=10000, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0  # callers that shared another caller's in-flight fetch
+        self.entries = OrderedDict()  # key -> (time stored, value), least recently used first
+        self.inflight = {}  # key -> Future of the fetch in progress
+        self.lock = threading.Lock()
+
+    def lookup(self, key, fetch, store=None):
+        # Return the value for key, calling fetch(key) at most once for concurrent callers
+        # If store is given, store(value) returns what later callers should get for key, or None to keep nothing.
+        key = key.strip().upper()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if time.monotonic() - entry[0] <= self.ttl:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self.entries[key]
+            waiter = self.inflight.get(key)
+            leader = waiter is None
+            if leader:
+                waiter = self.inflight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return waiter.result()
+
+        # Whatever fetch or store raises goes to the waiters too, so nobody blocks on a lookup that died
+        try:
+            value = fetch(key)
+            with self.lock:
+                kept = value if store is None else store(value)
+                if kept is not None:
+                    self.entries[key] = (time.monotonic(), kept)
+                    self.entries.move_to_end(key)
+                    while len(self.entries) > self.maxsize:
+                        self.entries.popitem(last=False)
+        except BaseException as exc:
+            waiter.set_exception(exc)
+            raise
+        finally:
+            with self.lock:
+                del self.inflight[key]
+        waiter.set_result(value)
+        return value
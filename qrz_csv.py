@@ -0,0 +1,51 @@
+import atexit
+import csv
+import os
+import time
+
+# v1.01
+# Long-lived, group-committed CSV writer for _emails.csv and qrz_callsign.csv
+# Rows are buffered and written in groups of maxrows, or once interval seconds have passed since the last write,
+# instead of opening, writing and closing the file for every record.  close() makes a final durable (fsync) flush and
+# is registered with atexit, so rows still in the buffer are saved when the program exits or is interrupted.
+
+
+class BufferedCSVWriter:
+
+    def __init__(self, filename, maxrows=100, interval=5.0, onflush=None):
+        self.filename = filename
+        self.maxrows = maxrows  # rows buffered before they are written
+        self.interval = interval  # seconds before buffered rows are written regardless of count
+        self.onflush = onflush  # called after every flush, i.e. to checkpoint the rows just written
+        self.rows = []
+        self.lastflush = time.monotonic()
+        self.file = open(filename, 'a', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        atexit.register(self.close)
+
+    def writerow(self, row):
+        self.rows.append(row)
+        self.poll()
+
+    def poll(self):
+        # Write the buffered rows once there are enough of them or they have waited long enough
+        if len(self.rows) >= self.maxrows or time.monotonic() - self.lastflush >= self.interval:
+            self.flush()
+
+    def flush(self, durable=False):
+        if self.rows:
+            self.writer.writerows(self.rows)
+            self.rows = []
+        self.file.flush()
+        if durable:
+            os.fsync(self.file.fileno())
+        self.lastflush = time.monotonic()
+        if self.onflush is not None:
+            self.onflush()
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush(durable=True)
+        self.file.close()
+        atexit.unregister(self.close)
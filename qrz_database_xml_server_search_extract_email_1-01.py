@@ -1,8 +1,25 @@
-import urllib.request
+import argparse
+import atexit
+import functools
 import getpass
+import os
+import sys
 from os import path
 import csv
 import datetime
+import time
+from qrz_http import ConnectionPool
+import qrz_batch
+from qrz_batch import orderedmap, dedupcallsigns, Journal
+from qrz_session import SessionManager
+from qrz_csv import BufferedCSVWriter
+from qrz_ratelimit import RateLimiter
+from qrz_timing import StageTimer
+from qrz_profile import startprofile
+from qrz_metrics import BatchMetrics
+from qrz_output import makeoutput, sinks
+from qrz_cache import CallsignCache, MemoryCache, cachefilename
+from qrz_xml import cachedresponse
 
 # v1.01
 # Logs into QRZ XML Database Server
@@ -79,72 +96,15 @@ qrz_fields = ("Callsign", "Cross Reference", "Aliases", "DXCC Entity ID", "First
               "Returns paper QSL", "CQ Zone Identifier", "ITU Zone Identifier", "Operator's Year of Birth",
               "QRZ Record Manager", "Accepts LOTW", "IOTA Designator", "Source of Lat/Long data")
 
-# Initialize record fields with header labels & write header record to file
-# Specify header label order
-call = qrz_fields[0]  # callsign
-xref = qrz_fields[1]  # Cross reference: the query callsign that returned this record
-aliases = qrz_fields[2]  # Other callsigns that resolve to this record
-dxcc = qrz_fields[3]  # DXCC entity ID (country code for the callsign
-fname = qrz_fields[4]  # first name
-name = qrz_fields[5]  # last name
-addr1 = qrz_fields[6]  # address line 1 (i.e. house # and street)
-addr2 = qrz_fields[7]  # address line 2 (i.e. city name)
-state = qrz_fields[8]  # state (USA only)
-zip = qrz_fields[9]  # Zip/postal code
-country = qrz_fields[10]  # country name for the QSL mailing address
-ccode = qrz_fields[11]  # DXCC entity code for the mailing address country
-lat = qrz_fields[12]  # latitude of address (signed decimal) S < 0 > N
-lon = qrz_fields[13]  # longitude of address (signed decimal) W < 0 > E
-grid = qrz_fields[14]  # grid locator
-county = qrz_fields[15]  # county name (USA)
-fips = qrz_fields[16]  # FIPS county identifier (USA)
-land = qrz_fields[17]  # DXCC country name of the callsign
-efdate = qrz_fields[18]  # license effective date (USA)
-expdate = qrz_fields[19]  # license expiration date (USA)
-p_call = qrz_fields[20]  # previous callsign
-license_class = qrz_fields[21]  # "<class>" license class
-license_codes = qrz_fields[22]  # "<codes>" license type codes (USA)
-qslmgr = qrz_fields[23]  # QSL manager info
-email = qrz_fields[24]  # email address
-qrz_webpage_addr = qrz_fields[25]  # web page address
-u_views = qrz_fields[26]  # QRZ web page views
-bio = qrz_fields[27]  # approximate length of the bio HTML in bytes
-biodate = qrz_fields[28]  # date of the last bio update
-image = qrz_fields[29]  # full URL of the callsign's primary image
-imageinfo = qrz_fields[30]  # height:width:size in bytes, of the image file
-serial = qrz_fields[31]  # QRZ database serial number
-moddate = qrz_fields[32]  # QRZ callsign last modified date
-MSA = qrz_fields[33]  # Metro Service Area (USPS)
-AreaCode = qrz_fields[34]  # Telephone Area Code (USA)
-TimeZone = qrz_fields[35]  # Time Zone (USA)
-GMTOffset = qrz_fields[36]  # GMT Time Offset
-DST = qrz_fields[37]  # Daylight Savings Time Observed
-eqsl = qrz_fields[38]  # Will accept e-qsl (0/1 or blank if unknown)
-mqsl = qrz_fields[39]  # Will return paper QSL (0/1 or blank if unknown)
-cqzone = qrz_fields[40]  # CQ Zone identifier
-ituzone = qrz_fields[41]  # ITU Zone identifier
-born = qrz_fields[42]  # operator's year of birth
-user = qrz_fields[43]  # User who manages this callsign on QRZ
-lotw = qrz_fields[44]  # Will accept LOTW (0/1 or blank if unknown)
-iota = qrz_fields[45]  # IOTA Designator (blank if unknown)
-geoloc = qrz_fields[46]  # Describes source of lat/long data
-
-# qrz_fields = ("call", "xref", "aliases", "dxcc", "fname", "name", "addr1", "addr2", "state", "zip", "country", "ccode",
-#              "lat", "lon", "grid", "county", "fips", "land", "efdate", "expdate", "p_call", "license class",
-#              "license codes", "qslmgr", "email", "url", "u_views", "bio", "biodate", "image", "imageinfo", "serial",
-#              "moddate","MSA", "AreaCode", "TimeZone", "GMTOffset", "DST", "eqsl", "mqsl", "cqzone", "ituzone", "born",
-#              "user", "lotw", "iota", "geoloc")
-
-qrz_record = [call, xref, aliases, dxcc, fname, name, addr1, addr2, state, zip, country, ccode, lat, lon, grid, county,
-              fips, land, efdate, expdate, p_call, license_class, license_codes, qslmgr, email, qrz_webpage_addr,
-              u_views, bio, biodate, image, imageinfo, serial, moddate, MSA, AreaCode, TimeZone, GMTOffset, DST, eqsl,
-              mqsl, cqzone, ituzone, born, user, lotw, iota, geoloc]
-
 servername = "QRZ Database XML Server"
 csvfilename = "_emails.csv"
 keyfilename = "qrz.key"
 callsfilename = "_callsigns.txt"
-xmlsessionfile = ""
+journalfilename = "_callsigns.journal"
+xmlsessionfile = None
+callcache = None
+sessionfields = {}
+callsignfields = {}
 key = ""
 
 # loginxmlurl = 'http://www.qrz.com/dxml/xml.pl' -- this URL (from C# source code of QRZXMLReference)
@@ -152,6 +112,10 @@ key = ""
 
 loginxmlurl = 'http://xmldata.qrz.com/xml/'  # -- updated URL from https://www.qrz.com/page/current_spec.html
 
+# QRZ_XML_SERVER points the script at another server, i.e. qrz_mockserver.py: http://127.0.0.1:8080/xml/
+loginxmlurl = os.environ.get("QRZ_XML_SERVER", loginxmlurl)
+qrzpool = None
+
 # * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * *
 # *                                                                 *
 # *                          Functions                              *
@@ -159,15 +123,21 @@ loginxmlurl = 'http://xmldata.qrz.com/xml/'  # -- updated URL from https://www.q
 # * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * *
 
 def qrzlogin():
-    username = input("Login with your QRZ username: ")
+    # Open a connection to the server while the user types their credentials
+    qrzpool.warm()
+    username = args.username or output.prompt("Login with your QRZ username: ")
 
     # SECURITY WARNING!!! This Python script may display your QRZ password in PLAIN TEXT on the console!!!
-    print("\n!!!SECURITY WARNING!!! This Python script may display your QRZ password in PLAIN TEXT on the console!!!")
-    print("\n!!!SECURITY WARNING!!! This Python script sends your QRZ password in PLAIN TEXT over an <! UNSECURE !>")
-    print("Hypertext Transfer Protocol (http) Internet connection!!!  If you are uncomfortable with this, please")
-    print("enter \"quit\" at the password prompt to immediately exit.\n")
+    output.message("\n!!!SECURITY WARNING!!! This Python script may display your QRZ password in PLAIN TEXT on the "
+                   "console!!!")
+    output.message("\n!!!SECURITY WARNING!!! This Python script sends your QRZ password in PLAIN TEXT over an "
+                   "<! UNSECURE !>")
+    output.message("Hypertext Transfer Protocol (http) Internet connection!!!  If you are uncomfortable with this, "
+                   "please")
+    output.message("enter \"quit\" at the password prompt to immediately exit.\n")
 
-    password = getpass.getpass("Enter your QRZ password: ")
+    # Unattended runs can supply the password in the QRZ_PASSWORD environment variable
+    password = os.environ.get("QRZ_PASSWORD") or getpass.getpass("Enter your QRZ password: ")
 
     if password == "quit": exit()
 
@@ -177,52 +147,63 @@ def qrzlogin():
     return url
 
 def getxml(url):
-    # Log in to QRZ Database XML server:
-    req = urllib.request.Request(url)
-    resp = urllib.request.urlopen(req)
-    respdata = resp.read()
-    # print("\nCaptured XML is " + str(len(respData)) + " bytes long.")
-    # print(respData)
-    xmlsessionfile = str(respdata)
+    # Send the request over a pooled keep-alive connection and parse the response bytes as they arrive
+    # qrzlimiter paces the requests and backs off while the server reports overload
+    xmlsessionfile = qrzlimiter.request(qrzfetch, url)
+    # print("\nCaptured XML is " + str(xmlsessionfile.nbytes) + " bytes long.")
     return xmlsessionfile
 
-def parsexml(tag,xml):
-    # Look for two occurrences of tag in xmlsessionfile (string)
-    # Place contents between tags into msg
-
-    # Find opening ('<' + tag) - tag already contains the closing '>'
-    startidx = xml.find('<' + tag) + len('<' + tag)
-
-    # Find ending ('</' + tag)
-    endidx = xml.find('</' + tag)
-
-#    print("Start index: " + str(startidx))
-#    print("End index: " + str(endidx))
-#    print(xml[startidx:endidx])
-
-    return startidx, endidx
+def lookupcallsign(searchcallSign):
+    # Runs on a worker thread when --workers is greater than 1
+    # Repeated callsigns are answered from memory, and workers asking for the same callsign at once share one fetch
+    return memcache.lookup(searchcallSign, fetchcallsign, keeprecord)
+
+def keeprecord(xmlsessionfile):
+    # Remember found records and "not found" answers for repeated callsigns, but not session errors
+    if xmlsessionfile.callsign and "Error" not in xmlsessionfile.session:
+        return cachedresponse(xmlsessionfile.callsign)
+    msg = xmlsessionfile.session.get("Error", "")
+    if msg.startswith("Not found"):
+        notfound = cachedresponse({})
+        notfound.session = {"Error": msg}
+        return notfound
+    return None
+
+def fetchcallsign(searchcallSign):
+    # Records looked up recently are answered from the local cache without a request to the server
+    if callcache is not None:
+        xmlsessionfile = callcache.response(searchcallSign)
+        if xmlsessionfile is not None:
+            return xmlsessionfile
+    # qrzsession logs in again and retries if the session key has expired
+    xmlsessionfile = qrzsession.lookup(searchcallSign)
+    if callcache is not None and xmlsessionfile.callsign and "Error" not in xmlsessionfile.session:
+        callcache.put(searchcallSign, xmlsessionfile.callsign)
+    return xmlsessionfile
 
 def instructions():
-    print("\nThis program repeatedly polls the {} with a list of amateur radio callsigns".format(servername))
-    print("stored in the text file - {}. The contents of each record are displayed on the console as they are "
-          .format(callsfilename))
-    print("accessed in real time. If the record contains an email address field, that record is added to the contents")
-    print("of the text file - {}. The contents of {} can be imported later to an Excel spreadsheet as a Comma "
-          .format(csvfilename,csvfilename))
-    print("Separated Values (.CSV) file. If you need a new file, delete the existing {} so this program can create"
-          .format(csvfilename))
-    print("a new one.")
-    print("This program will end if the {} returns any errors - i.e. \"not found\" or \"Session Timeout\".\n"
-          .format(servername))
-    print("*** If a record is not found in the {}:".format(servername))
-    print("    1> Open {} in a text editor.".format(callsfilename))
-    print("    2> Remove the callsign that triggered the error AND ALL PREVIOUS CALLSIGNS IN THE LIST.")
-    print("    3> Save {} and restart this program.\n".format(callsfilename))
-    print("*** If the {} returns the error \"Session Timeout\":".format(servername))
-    print("    1> Delete the text file {} and restart this program.".format(keyfilename))
-    print("       The program will not find {} and ask you for your QRZ login credentials.")
-    print("       After it logs into {}, you should be given a new session key, and this program will save it in {}\n"
-          .format(servername,keyfilename))
+    output.message("\nThis program repeatedly polls the {} with a list of amateur radio callsigns".format(servername))
+    output.message("stored in the text file - {}. The contents of each record are displayed on the console as they "
+                   "are".format(callsfilename))
+    output.message("accessed in real time. If the record contains an email address field, that record is added to "
+                   "the contents")
+    output.message("of the text file - {}. The contents of {} can be imported later to an Excel spreadsheet as a "
+                   "Comma".format(csvfilename, csvfilename))
+    output.message("Separated Values (.CSV) file. If you need a new file, delete the existing {} so this program can "
+                   "create".format(csvfilename))
+    output.message("a new one.")
+    output.message("Callsigns that are not found in the {} are skipped. Every processed callsign is recorded in {}."
+                   .format(servername, journalfilename))
+    output.message("This program will end if the {} returns any other error - i.e. \"Session Timeout\"."
+                   .format(servername))
+    output.message("Restart it after fixing the problem and it will continue where it stopped. Run it with --restart "
+                   "to")
+    output.message("process the whole list again.\n")
+    output.message("*** If the {} returns the error \"Session Timeout\", this program logs in again and saves the new"
+                   .format(servername))
+    output.message("    session key in {}. It asks for your QRZ login credentials the first time this happens unless "
+                   "they were".format(keyfilename))
+    output.message("    given with --username and the QRZ_PASSWORD environment variable.\n")
     return
 # * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * *
 # *                                                                 *
@@ -232,188 +213,173 @@ def instructions():
 
 error = 0
 
+argparser = argparse.ArgumentParser(description="Save the QRZ records of the callsigns in {} that have an email "
+                                                "address to {}".format(callsfilename, csvfilename))
+argparser.add_argument("-w", "--workers", type=int, default=1,
+                       help="number of lookups kept in flight at once (default: 1)")
+argparser.add_argument("--cache", default=cachefilename,
+                       help="SQLite file holding previously looked up records (default: {})".format(cachefilename))
+argparser.add_argument("--cache-days", type=float, default=7,
+                       help="days a cached record is used before it is looked up again (default: 7)")
+argparser.add_argument("--no-cache", action="store_true", help="look every callsign up on the server")
+argparser.add_argument("--journal", default=journalfilename,
+                       help="checkpoint file used to resume an interrupted run (default: {})".format(journalfilename))
+argparser.add_argument("--restart", action="store_true", help="ignore the journal and process every callsign again")
+argparser.add_argument("--rate", type=float, default=5,
+                       help="most lookups per second across all workers, 0 for no limit (default: 5)")
+argparser.add_argument("--daily-limit", type=int,
+                       help="lookups per day (as counted by the server) to spread the run over")
+argparser.add_argument("--server", default=loginxmlurl,
+                       help="XML server URL, i.e. a local qrz_mockserver.py (default: {})".format(loginxmlurl))
+argparser.add_argument("--username", help="QRZ username used when a new session key is needed")
+argparser.add_argument("--output", choices=sinks, default="console",
+                       help="how each record is shown: the full record, a one-line progress display, one JSON object "
+                            "per line on stdout or nothing (default: console)")
+argparser.add_argument("--timing", action="store_true",
+                       help="time each stage of every lookup and print histograms at the end")
+argparser.add_argument("--profile", nargs="?", const="qrz_extract.prof", metavar="FILE",
+                       help="profile the run with cProfile, save it to FILE (default: qrz_extract.prof) and print the "
+                            "top functions at the end")
+argparser.add_argument("--profile-top", type=int, default=25, help="functions listed by --profile (default: 25)")
+argparser.add_argument("--metrics-file", metavar="FILE",
+                       help="keep Prometheus metrics of the run in FILE (i.e. for node_exporter's textfile collector)")
+argparser.add_argument("--metrics-port", type=int, metavar="PORT",
+                       help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics during the run")
+argparser.add_argument("--metrics-interval", type=float, default=15,
+                       help="seconds between --metrics-file updates (default: 15)")
+argparser.add_argument("--memory-cache", type=int, default=10000,
+                       help="most records kept in memory for repeated callsigns (default: 10000)")
+args = argparser.parse_args()
+# Everything shown from here on goes through the sink, so jsonl keeps stdout machine readable and silent stays quiet
+output = makeoutput(args.output, servername, args.cache)
+# Reports asked for on the command line go to stderr when stdout carries JSON or is meant to stay empty
+reportstream = sys.stdout if args.output in ("console", "progress") else sys.stderr
+if args.profile:
+    startprofile(args.profile, args.profile_top, reportstream)
+loginxmlurl = args.server
+# Keep-alive connections to the XML server are reused for every lookup, with one idle connection kept per worker
+qrzpool = ConnectionPool(loginxmlurl, max(8, args.workers))
+memcache = MemoryCache(args.memory_cache)
+qrzlimiter = RateLimiter(args.rate, burst=max(1, args.workers), dailylimit=args.daily_limit)
+qrzsession = SessionManager(loginxmlurl, getxml, qrzlogin, keyfilename)
+stagetimer = StageTimer() if args.timing else None
+qrzpool.timer = qrzsession.timer = stagetimer
+qrzfetch = qrzpool.fetch
+# Throughput, errors and quota can be watched from outside the process
+qrzmetrics = None
+if args.metrics_file or args.metrics_port:
+    qrzmetrics = BatchMetrics()
+    qrzmetrics.addcache("memory", memcache)
+    qrzfetch = functools.partial(qrzmetrics.request, qrzpool.fetch)
+    if args.metrics_file:
+        qrzmetrics.textfile(args.metrics_file, args.metrics_interval)
+    if args.metrics_port:
+        qrzmetrics.serve(args.metrics_port)
+    atexit.register(qrzmetrics.close)
+
 # Error codes are binary in nature
 # Bit 3 indicates that the callsign input text file does not exist - this is grounds for immediate program termination.
 # Bit 2 indicates no Session Key returned from server - program needs a session key to access the server
 # Bit 1 indicates an error message from the server - program terminates so user can handle it
 # Bit 0 indicates no response from QRZ server - this is grounds for immediate program termination.
 
-print("\nQRZ CALL SIGN SEARCH v1.01")
+output.message("\nQRZ CALL SIGN SEARCH v1.01")
 instructions()
-prompt = input("Enter 'y' if you are ready to proceed or any other key to exit...")
-prompt = prompt.lower()
-if prompt != 'y': exit(error)
+# Only the console output asks before starting - the other sinks are meant for unattended runs
+if args.output == "console":
+    prompt = input("Enter 'y' if you are ready to proceed or any other key to exit...")
+    prompt = prompt.lower()
+    if prompt != 'y': exit(error)
 
 # If callsign TXT file does not exist, exit & report error
 if not path.exists(callsfilename):
-    print("*** ERROR 4 -- Callsign input TXT file does not exist...")
-    print("Create the file and place it in the working directory.")
+    output.error("*** ERROR 4 -- Callsign input TXT file does not exist...")
+    output.error("Create the file and place it in the working directory.")
     error += 8  # Set error code bit 3
     exit(error)  # Exit the program immediately.  This program cannot work without this data file.
 
 # If CSV file does not exist, create it & write the header record
 if not path.exists(csvfilename):
-    print("*** CSV file does not exist...creating new file...")
+    output.message("*** CSV file does not exist...creating new file...")
     # Open csv formatted file - 'w'rite csv as 'b'inary
-    csvFile = open(csvfilename, 'w', newline='')
+    csvFile = open(csvfilename, 'w', newline='', encoding='utf-8')
     writer = csv.writer(csvFile)
 
     # Create CSV header record from QRZ XML Database fields
-# qrz_record = [call, email, xref, aliases, p_call,
-#                   fname, name, addr1, addr2, state, zip, county, efdate,
-#                   expdate, license_class]
-
-    # Tried this because the statements below are tedious
-#    writer.writerow(qrz_record)
-
-    writer.writerow([call, xref, aliases, dxcc, fname, name, addr1, addr2, state, zip, country, ccode, lat, lon, grid,
-                     county, fips, land, efdate, expdate, p_call, license_class, license_codes, qslmgr, email,
-                     qrz_webpage_addr, u_views, bio, biodate, image, imageinfo, serial, moddate, MSA, AreaCode,
-                     TimeZone, GMTOffset, DST, eqsl, mqsl, cqzone, ituzone, born, user, lotw, iota, geoloc])
+    writer.writerow(qrz_fields)
 
     # Close the file
     csvFile.close()
 
-# Unsuccessful attempt to clear record fields of header strings
-# for field in range(0,len(qrz_record)): qrz_record[field] = ""
-
-# This does not work because each item in the qrz_record list is assigned its value by those variables.
-# This does not clear the individual variable. It only clears the values in the list.
-# This is the result in the CSV file:
-# (header record):  call,xref,aliases,dxcc,fname,name,addr1,addr2,state,zip,country,ccode,lat,lon,grid,county,fips,...
-# (queried record): KB1EJH,xref,aliases,291,Carl,Davis,PO BOX 180,Georgetown,DE,19947-0180,United States,271,...
-# (desired record): KB1EJH,,,291,Carl,Davis,PO BOX 180,Georgetown,DE,19947-0180,United States,271,38.691139,...
-
-# Clear record fields of header strings (the tedious way)
-call = ""
-xref = ""
-aliases = ""
-dxcc = ""
-fname = ""
-name = ""
-addr1 = ""
-addr2 = ""
-state = ""
-zip = ""
-country = ""  # qrz_fields[10]
-ccode = ""  # qrz_fields[11]
-lat = ""  # qrz_fields[12]
-lon = ""  # qrz_fields[13]
-grid = ""  # qrz_fields[14]
-county = ""  # qrz_fields[15]
-fips = ""  # qrz_fields[16]
-land = ""  # qrz_fields[17]
-efdate = ""  # qrz_fields[18]
-expdate = ""  # qrz_fields[19]
-p_call = ""  # qrz_fields[20]
-license_class = ""  # qrz_fields[21]
-license_codes = ""  # qrz_fields[22]
-qslmgr = ""  # qrz_fields[23]
-email = ""  # qrz_fields[24]
-qrz_webpage_addr = ""  # qrz_fields[25] # web page address
-u_views = ""  # qrz_fields[26] # QRZ web page views
-bio = ""  # qrz_fields[27] # approximate length of the bio HTML in bytes
-biodate = ""  # qrz_fields[28] # date of the last bio update
-image = ""  # qrz_fields[29] # full URL of the callsign's primary image
-imageinfo = ""  # qrz_fields[30] # height:width:size in bytes, of the image file
-serial = ""  # qrz_fields[31] # QRZ database serial number
-moddate = ""  # qrz_fields[32] # QRZ callsign last modified date
-MSA = ""  # qrz_fields[33] # Metro Service Area (USPS)
-AreaCode = ""  # qrz_fields[34] # Telephone Area Code (USA)
-TimeZone = ""  # qrzfields[35] # Time Zone (USA)
-GMTOffset = ""  # qrz_fields[36] # GMT Time Offset
-DST = ""  # qrz_fields[37] # Daylight Savings Time Observed
-eqsl = ""  # qrz_fields[38] # Will accept e-qsl (0/1 or blank if unknown)
-mqsl = ""  # qrz_fields[39] # Will return paper QSL (0/1 or blank if unknown)
-cqzone = ""  # qrz_fields[40] # CQ Zone identifier
-ituzone = ""  # qrz_fields[41] # ITU Zone identifier
-born = ""  # qrz_fields[42] # operator's year of birth
-user = ""  # qrz_fields[43] # User who manages this callsign on QRZ
-lotw = ""  # qrz_fields[44] # Will accept LOTW (0/1 or blank if unknown)
-iota = ""  # qrz_fields[45] # IOTA Designator (blank if unknown)
-geoloc = ""  # qrz_fields[46] # Describes source of lat/long data
-
-print("*** Checking for saved session key...")
-
-if not path.exists(keyfilename):
-    print("*** Session key file not found...")
+output.message("*** Checking for saved session key...")
+
+if not qrzsession.loadkey():
+    output.message("*** Session key file not found...")
 
     # Login and get a new session key
 
-    url = qrzlogin()
-    xmlsessionfile = getxml(url)
+    xmlsessionfile = qrzsession.newsession()
+    sessionfields, callsignfields = xmlsessionfile.session, xmlsessionfile.callsign
 
-    print("\n")
-    # print(xmlsessionfile) # Uncomment this statement for debugging purposes
+    output.message("\n")
+    # print(sessionfields, callsignfields) # Uncomment this statement for debugging purposes
 
     # Parse login response:
 
     # These strings are found in all successful connections:
     # If not found, exit with an error message
-    if "<QRZDatabase " in xmlsessionfile:
-        print("Connected to " + servername + "...")
-        print("Captured XML is " + str(len(xmlsessionfile)) + " bytes long.")
-        (startidx, endidx) = parsexml("GMTime>", xmlsessionfile)
-        print("Session Timestamp:> " + xmlsessionfile[startidx:endidx] + " GMT")
-        # msg = xmlsessionfile[startidx:endidx]
+    if xmlsessionfile.database:
+        output.message("Connected to " + servername + "...")
+        output.message("Captured XML is " + str(xmlsessionfile.nbytes) + " bytes long.")
+        output.message("Session Timestamp:> " + sessionfields.get("GMTime", "") + " GMT")
     else:
         error += 1  # Set error code bit 0
-        print("\n*** ERROR: No response from {}.".format(servername))
+        output.error("\n*** ERROR: No response from {}.".format(servername))
         exit(error)  # Exit immediately.  This program cannot work without a communications link to the server.
 
     # These strings are found in unsuccessful logins:
-    if "<Remark>" in xmlsessionfile:
-        (startidx, endidx) = parsexml("Remark>", xmlsessionfile)
-        msg = xmlsessionfile[startidx:endidx]
-        print("QRZ Database Remark:> \"" + msg + "\"")
-
-    if "<Error>" in xmlsessionfile:
-        (startidx, endidx) = parsexml("Error>", xmlsessionfile)
-        msg = xmlsessionfile[startidx:endidx]
-        print("QRZ Database Error:> " + msg)
+    if "Remark" in sessionfields:
+        msg = sessionfields["Remark"]
+        output.message("QRZ Database Remark:> \"" + msg + "\"")
+
+    if "Error" in sessionfields:
+        msg = sessionfields["Error"]
+        output.message("QRZ Database Error:> " + msg)
         error += 2  # Set error code bit 1
-        print("\n*** ERROR: " + servername + " reported an error.")
+        output.error("\n*** ERROR: " + servername + " reported an error.")
         # exit("\n*** ERROR 2: QRZ database server reported an error.")
 
     # These strings are found in successful logins:
-    if "<Count>" in xmlsessionfile:
-        (startidx, endidx) = parsexml("Count>", xmlsessionfile)
-        msg = xmlsessionfile[startidx:endidx]
-        print("You have used this service " + msg + " times today.")
-
-    if "<SubExp>" in xmlsessionfile:
-        (startidx, endidx) = parsexml("SubExp>", xmlsessionfile)
-        msg = xmlsessionfile[startidx:endidx]
-        print("Subscription expires:> " + msg)
-
-    if "<Key>" in xmlsessionfile:
-        (startidx, endidx) = parsexml("Key>", xmlsessionfile)
-        msg = xmlsessionfile[startidx:endidx]
-        print("Your session key:> " + msg)
+    if "Count" in sessionfields:
+        msg = sessionfields["Count"]
+        output.message("You have used this service " + msg + " times today.")
+
+    if "SubExp" in sessionfields:
+        msg = sessionfields["SubExp"]
+        output.message("Subscription expires:> " + msg)
+
+    if "Key" in sessionfields:
+        msg = sessionfields["Key"]
+        output.message("Your session key:> " + msg)
         key = msg
-        # This is immediately after login. This is a brand new key - Save the key for later
-        keyfile = open(keyfilename, 'w')
-        keyfile.write(key)
-        keyfile.close()
-        print("*** Session key saved...\n")
+        # This is immediately after login. This is a brand new key - qrzsession has saved it for later
+        output.message("*** Session key saved...\n")
 
     else: # No Session Key returned from server
         error += 2  # Set error bit 2
-        print("\n*** ERROR: No Session Key returned from " + servername + ".")
+        output.error("\n*** ERROR: No Session Key returned from " + servername + ".")
 
 
 else: # Session key file exists
-    keyfile = open(keyfilename, "r")
-    key = keyfile.read()
-    keyfile.close()
-    print("Session key retrieved from file...")
+    key = qrzsession.key
+    output.message("Session key retrieved from file...")
 
-print("\n")
+output.message("\n")
 if error > 0:
-    print("Error code: {}".format(error))
+    output.error("Error code: {}".format(error))
     exit(error) # Exit with error code if necessary
 
-# if not "<Callsign>" in xmlsessionfile:
+# if not callsignfields:
     # Retrieve search string from user:
 #    searchcallSign = input("Enter call sign for search: ")
 
@@ -427,432 +393,126 @@ if error > 0:
 #                                                                                                                          ^^^^^-- Callsign in 2nd record
 # Let's try default text mode, not 'r' - same result: starting with second record
 
+if not args.no_cache:
+    callcache = CallsignCache(args.cache, args.cache_days * 86400)
+    if qrzmetrics is not None:
+        qrzmetrics.addcache("sqlite", callcache)
+
 searchcallSignfile = open(callsfilename, 'r', newline = '')
 searchcallSignlist = searchcallSignfile.readlines()
 searchcallSignfile.close()
-# for eachline in searchcallSignlist:  # removing this line caused it to begin at the first record, but it won't loop!!!
-for eachline in range (0,len(searchcallSignlist)):
-    url = loginxmlurl + "current/?s=" + key + ";callsign=" + searchcallSignlist[eachline]
-    xmlsessionfile = getxml(url)
 
-    print("\n")
-    # print(xmlsessionfile)  # Uncomment this statement for debugging purposes
+# Each callsign is looked up once: blank lines, repeats and /P style variants of a callsign are collapsed first
+searchcallSignlist, blanks, duplicates, variants, invalid = dedupcallsigns(searchcallSignlist)
+if duplicates or variants:
+    output.message("*** {} duplicate and {} variant entries in {} collapsed into {} callsigns".format(
+        duplicates, sum(map(len, variants.values())), callsfilename, len(searchcallSignlist)))
+    for searchcallSign, spellings in variants.items():
+        output.message("    {} <- {}".format(searchcallSign, ", ".join(spellings)))
+if blanks:
+    output.message("*** {} blank lines skipped".format(blanks))
+# Lines that are not a callsign are not looked up - fix them in the file to have them processed
+if invalid:
+    output.message("*** {} lines in {} skipped - not a callsign:".format(len(invalid), callsfilename))
+    for line in invalid:
+        output.message("    " + line)
+
+# Skip the callsigns a previous run already finished
+journal = Journal(args.journal, None if qrzmetrics is None else qrzmetrics.complete)
+if args.restart:
+    journal.restart()
+skipped = len(searchcallSignlist)
+searchcallSignlist = [searchcallSign for searchcallSign in searchcallSignlist if not journal.completed(searchcallSign)]
+skipped -= len(searchcallSignlist)
+if skipped:
+    output.message("*** Resuming: {} callsigns already processed according to {}".format(skipped, args.journal))
+
+# Rows are written to the CSV file in groups; the journal is checkpointed after each group reaches the file
+csvwriter = BufferedCSVWriter(csvfilename, onflush=journal.flush)
+# for eachline in searchcallSignlist:  # removing this line caused it to begin at the first record, but it won't loop!!!
+# Up to args.workers lookups run at once; orderedmap() hands back the responses in the order of _callsigns.txt
+lookups = orderedmap(lookupcallsign, searchcallSignlist, args.workers)
+output.begin(len(searchcallSignlist), key)
+eachline = -1
+for eachline, (searchcallSign, xmlsessionfile) in enumerate(lookups):
+    sessionfields, callsignfields = xmlsessionfile.session, xmlsessionfile.callsign
+    # print(sessionfields, callsignfields)  # Uncomment this statement for debugging purposes
 
 # "Not all fields may be returned with each request. The field ordering is arbitrary and subject to change."
 # qrz.com/XML/current_spec.html
 
-# Parse XML response:
-
-# These strings are found in all successful connections:
-# If not found, exit with an error message
-    if "<QRZDatabase " in xmlsessionfile:
-            print("Connected to " + servername + "...")
-            print("Captured XML is " + str(len(xmlsessionfile)) + " bytes long.")
-            (startidx, endidx) = parsexml("GMTime>", xmlsessionfile)
-            print("Session Timestamp:> " + xmlsessionfile[startidx:endidx] + " GMT")
-            # msg = xmlsessionfile[startidx:endidx]
+    # A reply without <QRZDatabase> means there was no response from the server; "Not found" is skipped and any
+    # other <Error> ends the run
+    msg = sessionfields.get("Error", "")
+    if not xmlsessionfile.database:
+        status = qrz_batch.failed
+        error += 1
+    elif msg and not msg.startswith("Not found"):
+        status = qrz_batch.failed
+        error += 2
+    elif msg:
+        status = qrz_batch.notfound
+    else:
+        status = qrz_batch.done
+
+    # Queue the checkpoint before the row: a group flush that writes this row then also writes its journal line,
+    # so a kill can never leave a row in the csv file that a resumed run would look up and write again
+    journal.record(searchcallSign, status)
+
+    # email address decides whether the record is written to the csv file
+    saved = status == qrz_batch.done and "email" in callsignfields
+    if saved:
+        # Buffer the record; csvwriter appends it to the csv file with the rest of its group
+        # A new QRZRecord is built for every response, so nothing carries over from the last callsign
+        if stagetimer is not None:
+            written = time.perf_counter()
+            csvwriter.writerow(xmlsessionfile.record().row())
+            stagetimer.record("csv write", time.perf_counter() - written)
+        else:
+            csvwriter.writerow(xmlsessionfile.record().row())
+
+    # The whole record is rendered and written once
+    if stagetimer is not None:
+        shown = time.perf_counter()
+        output.record(searchcallSign, xmlsessionfile, status, saved)
+        stagetimer.record("console", time.perf_counter() - shown)
     else:
-            error += 1
-            searchcallSignfile.close()
-            print("\n*** ERROR: No response from QRZ database server.")
-            exit(1)
-
-        # These strings are found in unsuccessful logins:
-    if "<Remark>" in xmlsessionfile:
-            (startidx, endidx) = parsexml("Remark>", xmlsessionfile)
-            msg = xmlsessionfile[startidx:endidx]
-            print("QRZ Database Remark:> \" {} \"").format(msg)
-
-    if "<Error>" in xmlsessionfile:
-            (startidx, endidx) = parsexml("Error>", xmlsessionfile)
-            msg = xmlsessionfile[startidx:endidx]
-            print("QRZ Database Error:> " + msg)
-            error += 2
-            searchcallSignfile.close()
-            print("\n*** ERROR: " + servername + " reported an error.")
-            exit(2)
-
-        # These strings are found in successful logins:
-    if "<Count>" in xmlsessionfile:
-            (startidx, endidx) = parsexml("Count>", xmlsessionfile)
-            msg = xmlsessionfile[startidx:endidx]
-            print("You have used this service " + msg + " times today.")
-
-    if "<SubExp>" in xmlsessionfile:
-            (startidx, endidx) = parsexml("SubExp>", xmlsessionfile)
-            msg = xmlsessionfile[startidx:endidx]
-            print("Subscription expires:> " + msg)
-
-    if "<Key>" in xmlsessionfile:
-            (startidx, endidx) = parsexml("Key>", xmlsessionfile)
-            msg = xmlsessionfile[startidx:endidx]
-            print("Your session key:> " + msg)
-            # This is immediately after a search query.  The keys may be the same - Saving the key may not be needed.
-            if key != msg:
-                keyfile = open(keyfilename, 'w')
-                keyfile.write(msg) # save the new key
-                keyfile.close()
-                print("*** Session key saved...\n")
-            key = msg # Regardless if new key == old key or new key != old key, make old key == new key
-
-# else:  # No Session Key returned from server
-#    print("\n*** ERROR 3: No Session Key returned from " + servername + ".")
-#    error = 3
-
-# if error > 0: exit(error) # Exit with error code if necessary
-
-        # parse callsign fields
-    if "<call>" in xmlsessionfile:
-            (startidx, endidx) = parsexml("call>", xmlsessionfile)
-            msg = xmlsessionfile[startidx:endidx]
-            print("\nCallsign: " + msg)
-            call = msg
-
-        # parse xref field
-    if "<xref>" in xmlsessionfile:
-            (startidx, endidx) = parsexml("xref>", xmlsessionfile)
-            msg = xmlsessionfile[startidx:endidx]
-            print("Cross Reference: " + msg)
-            xref = msg
-
-        # parse aliases field
-    if "<aliases>" in xmlsessionfile:
-            (startidx, endidx) = parsexml("aliases>", xmlsessionfile)
-            msg = xmlsessionfile[startidx:endidx]
-            print("Aliases: " + msg)
-            aliases = msg
-
-        # parse dxcc field
-    if "<dxcc>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("dxcc>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("DXCC Entity ID: " + msg)
-           dxcc = msg
-
-        # parse first name field
-    if "<fname>" in xmlsessionfile:
-            (startidx, endidx) = parsexml("fname>", xmlsessionfile)
-            msg = xmlsessionfile[startidx:endidx]
-            print("First Name: " + msg)
-            fname = msg
-
-        # parse last name field
-    if "<name>" in xmlsessionfile:
-            (startidx, endidx) = parsexml("name>", xmlsessionfile)
-            msg = xmlsessionfile[startidx:endidx]
-            print("Last Name: " + msg)
-            name = msg
-
-        # parse address line 1 field
-    if "<addr1>" in xmlsessionfile:
-            (startidx, endidx) = parsexml("addr1>", xmlsessionfile)
-            msg = xmlsessionfile[startidx:endidx]
-            print("Address Line 1: " + msg)
-            addr1 = msg
-
-        # parse address line 2 field
-    if "<addr2>" in xmlsessionfile:
-            (startidx, endidx) = parsexml("addr2>", xmlsessionfile)
-            msg = xmlsessionfile[startidx:endidx]
-            print("Address Line 2: " + msg)
-            addr2 = msg
-
-        # parse state field
-    if "<state>" in xmlsessionfile:
-            (startidx, endidx) = parsexml("state>", xmlsessionfile)
-            msg = xmlsessionfile[startidx:endidx]
-            print("State: " + msg)
-            state = msg
-
-        # parse zip field
-    if "<zip>" in xmlsessionfile:
-            (startidx, endidx) = parsexml("zip>", xmlsessionfile)
-            msg = xmlsessionfile[startidx:endidx]
-            print("ZIP Code: " + msg)
-            zip = msg
-
-        # parse country field
-    if "<country>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("country>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("Country: " + msg)
-           country = msg
-
-        # parse dxcc entity code field
-    if "<ccode>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("ccode>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("DXCC Entity Code: " + msg)
-           ccode = msg
-
-        # parse latitude field
-    if "<lat>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("lat>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("Latitude: " +msg)
-           lat = msg
-
-        # parse longitude field
-    if "<lon>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("lon>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("Longitude: " +msg)
-           lon = msg
-
-        # parse grid locator field
-    if "<grid>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("grid>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("Grid Locator: " +msg)
-           grid = msg
-
-        # parse county field
-    if "<county>" in xmlsessionfile:
-            (startidx, endidx) = parsexml("county>", xmlsessionfile)
-            msg = xmlsessionfile[startidx:endidx]
-            print("County: " +msg)
-            county = msg
-
-        # parse FIPS county identifier field
-    if "<fips>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("fips>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("FIPS: " +msg)
-           fips = msg
-
-        # parse land field
-    if "<land>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("land>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("DXCC Country: " +msg)
-           land = msg
-
-        # parse license effective date field
-    if "<efdate>" in xmlsessionfile:
-            (startidx, endidx) = parsexml("efdate>", xmlsessionfile)
-            msg = xmlsessionfile[startidx:endidx]
-            # Clean up this field with datetime if necessary
-            print("License Effective Date: " +msg)
-            efdate = msg
-
-        # parse license expiration date field
-    if "<expdate>" in xmlsessionfile:
-            (startidx, endidx) = parsexml("expdate>", xmlsessionfile)
-            msg = xmlsessionfile[startidx:endidx]
-            # Clean up this field with datetime if necessary
-            print("License Expiration Date: " +msg)
-            expdate = msg
-
-        # parse previous callsign field
-    if "<p_call>" in xmlsessionfile:
-            (startidx, endidx) = parsexml("p_call>", xmlsessionfile)
-            msg = xmlsessionfile[startidx:endidx]
-            print("Previous Callsign: " +msg)
-            p_call = msg
-
-        # parse license class field
-    if "<class>" in xmlsessionfile:
-            (startidx, endidx) = parsexml("class>", xmlsessionfile)
-            msg = xmlsessionfile[startidx:endidx]
-            print("License Class: " +msg)
-            license_class = msg
-
-        # parse license type codes field
-    if "<codes>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("codes>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("License Type Codes: " +msg)
-           license_codes = msg
-
-        # parse QSL Manager field
-    if "<qslmgr>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("qslmgr>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("QSL Manager: " +msg)
-           qslmgr = msg
-
-        # moved email address to end as a condition to write the record to a csv file
-        # parse email address field
-        # if "<email>" in xmlsessionfile:
-        #     (startidx, endidx) = parsexml("email>", xmlsessionfile)
-        #     msg = xmlsessionfile[startidx:endidx]
-        #     print("Email Address: " +msg)
-        #     email = msg
-
-        # parse QRZ webpage URL field
-    if "<url>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("url>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("QRZ webpage URL: " +msg)
-           qrz_webpage_addr = msg
-
-        # parse QRZ webpage views field
-    if "<u_views>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("u_views>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("QRZ webpage views: " +msg)
-           u_views = msg
-
-        # parse biography length field
-    if "<bio>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("bio>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("QRZ Biography length (bytes): " +msg)
-           bio = msg
-
-        # parse biography update date field
-    if "<biodate>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("biodate>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           # Clean up this field with datetime if necessary
-           print("QRZ Biography last update: " +msg)
-           biodate = msg
-
-        # parse image field
-    if "<image>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("image>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("Image URL: " +msg)
-           image = msg
-
-        # parse image specifications field
-    if "<imageinfo>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("imageinfo>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("Image specifications (height:width:bytes): " +msg)
-           imageinfo = msg
-
-        # parse QRZ database serial number field
-    if "<serial>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("serial>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("QRZ Database Serial #: " +msg)
-           serial = msg
-
-        # parse QRZ callsign last modified date field
-    if "<moddate>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("moddate>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           # Clean up this field with datetime if necessary
-           print("QRZ callsign last modified date: " +msg)
-           moddate = msg
-
-        # parse USPS Metro Service Area field
-    if "<MSA>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("MSA>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("USPS Metro Service Area: " +msg)
-           MSA = msg
-
-        # parse Telephone Area Code field
-    if "<AreaCode>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("AreaCode>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("Telephone Area Code: " +msg)
-           AreaCode = msg
-
-        # parse Time Zone field
-    if "<TimeZone>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("TimeZone>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("Time Zone: " +msg)
-           TimeZone = msg
-
-        # parse GMT Offset field
-    if "<GMTOffset>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("GMTOffset>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("GMT Offset: " +msg)
-           GMTOffset = msg
-
-        # parse Daylight Savings Time Observed field
-    if "<DST>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("DST>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("Observes Daylight Savings Time: " +msg)
-           DST = msg
-
-        # parse eQSL field
-    if "<eqsl>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("eqsl>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("Accepts eQSL: " +msg)
-           eqsl = msg
-
-        # parse paper QSL field
-    if "<mqsl>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("mqsl>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("Returns paper QSL: " +msg)
-           mqsl = msg
-
-        # parse CQ Zone Identifier field
-    if "<cqzone>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("cqzone>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("CQ Zone Identifier: " +msg)
-           cqzone = msg
-
-        # parse ITU Zone Identifier field
-    if "<ituzone>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("ituzone>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("ITU Zone Identifier: " +msg)
-           ituzone = msg
-
-        # parse year of birth field
-    if "<born>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("born>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("Year of Birth: " +msg)
-           born = msg
-
-        # parse QRZ record manager field
-    if "<user>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("user>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("QRZ Database Record Manager: " +msg)
-           user = msg
-
-        # parse Accepts Logbook of the World QSL field
-    if "<lotw>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("lotw>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("Accepts LOTW: " +msg)
-           lotw = msg
-
-        # parse IOTA Designator field
-    if "<iota>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("iota>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("IOTA Designator: " +msg)
-           iota = msg
-
-        # parse Source of latitude/longitude data field
-    if "<geoloc>" in xmlsessionfile:
-           (startidx, endidx) = parsexml("geoloc>", xmlsessionfile)
-           msg = xmlsessionfile[startidx:endidx]
-           print("Source of Lat/Long: " +msg)
-           geoloc = msg
-
-        # parse email address field
-    if "<email>" in xmlsessionfile:
-            (startidx, endidx) = parsexml("email>", xmlsessionfile)
-            msg = xmlsessionfile[startidx:endidx]
-            print("Email Address: " +msg)
-            email = msg
-
-            # Open csv formatted file - 'a'ppend csv records
-            csvFile = open(csvfilename, 'a', newline='')
-            writer = csv.writer(csvFile)
-
-            writer.writerow([call, xref, aliases, dxcc, fname, name, addr1, addr2, state, zip, country, ccode, lat,
-                             lon, grid, county, fips, land, efdate, expdate, p_call, license_class, license_codes,
-                             qslmgr, email, qrz_webpage_addr, u_views, bio, biodate, image, imageinfo, serial, moddate,
-                             MSA, AreaCode, TimeZone, GMTOffset, DST, eqsl, mqsl, cqzone, ituzone, born, user, lotw,
-                             iota, geoloc])
-            csvFile.close()
-            print("\n*** Callsign saved to csv file...\n")
+        output.record(searchcallSign, xmlsessionfile, status, saved)
+
+    if status == qrz_batch.failed:
+        searchcallSignfile.close()
+        lookups.close()
+        csvwriter.close()
+        journal.close()
+        if error & 1:
+            output.error("\n*** ERROR: No response from QRZ database server.")
+        else:
+            output.error("\n*** ERROR: " + servername + " reported an error.")
+        output.close()
+        exit(error)
+
+    if "Key" in sessionfields:
+        key = sessionfields["Key"]  # This is immediately after a search query.  qrzsession saves a new key.
+
+    # The checkpoint reaches the journal file only when this record's CSV row reaches the csv file
+    csvwriter.poll()
 searchcallSignfile.close()
-print("Processed " + str(eachline + 1) + " records")
+csvwriter.close()
+journal.close()
+output.message("Processed " + str(eachline + 1) + " records")
+if qrzlimiter.backoffs:
+    output.message("Backed off {} times while {} was busy".format(qrzlimiter.backoffs, servername))
+if qrzsession.logins:
+    output.message("Logged in to {} {} times".format(servername, qrzsession.logins))
+if memcache.hits or memcache.coalesced:
+    output.message("{} repeated callsigns answered from memory".format(memcache.hits + memcache.coalesced))
+if callcache is not None:
+    output.message("{} records retrieved from local cache, {} looked up on {}".format(callcache.hits,
+                                                                                     callcache.misses, servername))
+    if callcache.aliashits:
+        output.message("{} of them were aliases of a cached callsign".format(callcache.aliashits))
+    callcache.close()
+output.close()
+if stagetimer is not None:
+    stagetimer.report(reportstream)
 exit()
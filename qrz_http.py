@@ -0,0 +1,161 @@
+import http.client
+import socket
+import ssl
+import threading
+import time
+import urllib.parse
+from qrz_timing import servercpu
+from qrz_xml import readresponse
+
+# v1.01
+# Keep-alive HTTP connection pool for the QRZ Database XML Server
+# Every lookup used to build a new urllib.request.Request and pay a DNS lookup plus a TCP handshake.
+# The pool keeps idle connections open between lookups, resolves the server's address once per dnsttl seconds and
+# can open a connection ahead of time (i.e. while the user is typing their password).
+# https:// URLs are sent over TLS (port 443 unless given); any other scheme is refused rather than sent as plain http.
+
+# Exceptions that mean the server closed an idle keep-alive connection - retry once on a fresh connection
+staleerrors = (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionResetError, BrokenPipeError,
+               ConnectionAbortedError)
+
+# Characters left alone when the request path is percent-encoded.  QRZ uses ';' to separate query arguments.
+safechars = "/?;=&:@%+,"
+
+# Default port of each supported URL scheme
+defaultports = {"http": 80, "https": 443}
+
+
+def serverparts(baseurl):
+    # (scheme, host, port) of a server URL.  Raises ValueError for a scheme other than http or https.
+    parts = urllib.parse.urlsplit(baseurl)
+    scheme = parts.scheme.lower()
+    if scheme not in defaultports:
+        raise ValueError("Unsupported URL scheme {!r} in {} - use http:// or https://".format(parts.scheme, baseurl))
+    return scheme, parts.hostname, parts.port or defaultports[scheme]
+
+
+class ConnectionPool:
+
+    def __init__(self, baseurl, maxsize=8, timeout=15, dnsttl=300):
+        self.scheme, self.host, self.port = serverparts(baseurl)
+        # Host header: the port is only left out when it is the scheme's default
+        self.hostheader = self.host if self.port == defaultports[self.scheme] else self.host + ":" + str(self.port)
+        self.context = ssl.create_default_context() if self.scheme == "https" else None
+        self.maxsize = maxsize  # most idle connections kept open
+        self.timeout = timeout  # socket timeout in seconds
+        self.dnsttl = dnsttl  # seconds before the server's address is resolved again
+        self.address = None
+        self.resolved = 0
+        self.idle = []
+        self.timer = None  # qrz_timing.StageTimer to time connect, first byte, body read and parse
+        self.lock = threading.Lock()
+
+    def resolve(self):
+        # Return the cached IP address of the server, looking it up again once it is older than dnsttl
+        with self.lock:
+            if self.address is None or time.monotonic() - self.resolved > self.dnsttl:
+                info = socket.getaddrinfo(self.host, self.port, type=socket.SOCK_STREAM)
+                self.address = info[0][4][0]
+                self.resolved = time.monotonic()
+            return self.address
+
+    def connect(self):
+        if self.context is None:
+            conn = http.client.HTTPConnection(self.resolve(), self.port, timeout=self.timeout)
+            conn.connect()
+            return conn
+        # Connect to the cached address, but check the certificate (and send SNI) for the server's host name
+        conn = http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout, context=self.context)
+        sock = socket.create_connection((self.resolve(), self.port), self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            conn.sock = self.context.wrap_socket(sock, server_hostname=self.host)
+        except BaseException:
+            sock.close()
+            raise
+        return conn
+
+    def get(self):
+        # Take an idle connection or open a new one
+        with self.lock:
+            if self.idle:
+                return self.idle.pop(), True
+        return self.connect(), False
+
+    def put(self, conn):
+        # Return a connection to the pool once its response has been read completely
+        with self.lock:
+            if len(self.idle) < self.maxsize:
+                self.idle.append(conn)
+                return
+        conn.close()
+
+    def warm(self):
+        # Open a connection ahead of the first request so the handshake is not on the lookup's critical path
+        try:
+            self.put(self.connect())
+        except OSError:
+            pass  # The first request will report the problem
+
+    def close(self):
+        with self.lock:
+            idle = self.idle
+            self.idle = []
+        for conn in idle:
+            conn.close()
+
+    def fetch(self, url):
+        # Send a GET for url over a pooled connection and stream-parse the reply with readresponse()
+        parts = urllib.parse.urlsplit(url)
+        selector = urllib.parse.quote(parts.path or "/", safe=safechars)
+        if parts.query:
+            selector += "?" + urllib.parse.quote(parts.query, safe=safechars)
+        headers = {"Host": self.hostheader, "Connection": "keep-alive"}
+
+        timer = self.timer
+        if timer is not None:
+            started = time.perf_counter()
+        conn, reused = self.get()
+        if timer is not None:
+            sent = time.perf_counter()
+            if not reused:
+                timer.record("connect", sent - started)
+        try:
+            conn.request("GET", selector, headers=headers)
+            resp = conn.getresponse()
+        except staleerrors:
+            conn.close()
+            if not reused:
+                raise
+            # The server dropped the idle connection - retry once on a new one
+            conn = self.connect()
+            try:
+                conn.request("GET", selector, headers=headers)
+                resp = conn.getresponse()
+            except BaseException:
+                conn.close()
+                raise
+        except BaseException:
+            conn.close()
+            raise
+
+        if timer is not None:
+            firstbyte = time.perf_counter() - sent
+            timer.record("first byte", firstbyte)
+        try:
+            response = readresponse(resp, timer)
+            response.status = resp.status
+            resp.read()  # drain anything the parser did not consume so the connection can be reused
+        except BaseException:
+            conn.close()
+            raise
+        if resp.will_close:
+            conn.close()
+        else:
+            self.put(conn)
+        if timer is not None:
+            cpu = servercpu(response)
+            if cpu is not None:
+                timer.record("server cpu", cpu)
+                timer.record("network", max(0.0, firstbyte - cpu))
+        return response
@@ -0,0 +1,175 @@
+import collections
+import http.server
+import os
+import threading
+import time
+
+# v1.01
+# Prometheus metrics for long batch runs
+# BatchMetrics counts completed lookups, errors by QRZ <Error> message, requests in flight, the latest <Count> quota
+# reading and a rolling window of request latencies, and reads the hit/miss counters of the registered caches.  It is
+# published in the Prometheus text format either as a textfile rewritten every few seconds (for node_exporter's
+# textfile collector) or on a local http://host:port/metrics endpoint, or both.
+
+# Latency quantiles reported over the rolling window
+quantiles = (0.5, 0.9, 0.95, 0.99)
+
+
+def errorlabel(msg):
+    # <Error> messages carry the callsign ("Not found: W1XYZ") - keep the part before the colon as the label
+    return msg.split(":", 1)[0].strip().replace("\\", "\\\\").replace('"', '\\"') or "unknown"
+
+
+class BatchMetrics:
+
+    def __init__(self, window=1000):
+        self.started = time.time()
+        self.completed = collections.Counter()  # journal status -> callsigns completed
+        self.errors = collections.Counter()  # <Error> message -> responses
+        self.requests = 0
+        self.inflight = 0
+        self.quota = None  # latest <Count>
+        self.latencies = collections.deque(maxlen=window)  # seconds of the most recent requests
+        self.latencysum = 0.0
+        self.caches = {}  # label -> object with .hits and .misses
+        self.lock = threading.Lock()
+        self.server = None
+        self.writer = None
+        self.closing = threading.Event()
+
+    def addcache(self, name, cache):
+        self.caches[name] = cache
+
+    def request(self, fetch, url):
+        # Call fetch(url) and account for it: in-flight gauge, latency, <Error> and <Count>
+        with self.lock:
+            self.inflight += 1
+        started = time.perf_counter()
+        try:
+            response = fetch(url)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.inflight -= 1
+                self.requests += 1
+                self.latencies.append(elapsed)
+                self.latencysum += elapsed
+        session = response.session
+        with self.lock:
+            if "Error" in session:
+                self.errors[errorlabel(session["Error"])] += 1
+            if "Count" in session:
+                try:
+                    self.quota = int(session["Count"])
+                except ValueError:
+                    pass
+        return response
+
+    def complete(self, status):
+        with self.lock:
+            self.completed[status] += 1
+
+    def render(self):
+        # The metrics in the Prometheus text exposition format
+        with self.lock:
+            latencies = sorted(self.latencies)
+            lines = [
+                "# HELP qrz_lookups_completed_total Callsigns processed, by journal status.",
+                "# TYPE qrz_lookups_completed_total counter",
+            ]
+            lines += ['qrz_lookups_completed_total{status="%s"} %d' % item for item in sorted(self.completed.items())]
+            lines += [
+                "# HELP qrz_errors_total Responses carrying an <Error>, by message.",
+                "# TYPE qrz_errors_total counter",
+            ]
+            lines += ['qrz_errors_total{error="%s"} %d' % item for item in sorted(self.errors.items())]
+            lines += [
+                "# HELP qrz_requests_in_flight Requests sent to the XML server and not yet answered.",
+                "# TYPE qrz_requests_in_flight gauge",
+                "qrz_requests_in_flight %d" % self.inflight,
+            ]
+            if self.quota is not None:
+                lines += [
+                    "# HELP qrz_quota_count Lookups used today according to the latest <Count>.",
+                    "# TYPE qrz_quota_count gauge",
+                    "qrz_quota_count %d" % self.quota,
+                ]
+            lines += [
+                "# HELP qrz_request_seconds Request latency over the last %d requests." % self.latencies.maxlen,
+                "# TYPE qrz_request_seconds summary",
+            ]
+            for quantile in quantiles:
+                value = latencies[min(len(latencies) - 1, int(quantile * len(latencies)))] if latencies else 0.0
+                lines.append('qrz_request_seconds{quantile="%s"} %.6f' % (quantile, value))
+            lines += [
+                "qrz_request_seconds_sum %.6f" % self.latencysum,
+                "qrz_request_seconds_count %d" % self.requests,
+            ]
+        if self.caches:
+            lines += ["# HELP qrz_cache_hits_total Lookups answered by a cache.",
+                      "# TYPE qrz_cache_hits_total counter"]
+            lines += ['qrz_cache_hits_total{cache="%s"} %d' % (name, cache.hits) for name, cache in self.caches.items()]
+            lines += ["# HELP qrz_cache_misses_total Lookups a cache could not answer.",
+                      "# TYPE qrz_cache_misses_total counter"]
+            lines += ['qrz_cache_misses_total{cache="%s"} %d' % (name, cache.misses)
+                      for name, cache in self.caches.items()]
+        lines += [
+            "# HELP qrz_batch_start_time_seconds Unix time the batch started.",
+            "# TYPE qrz_batch_start_time_seconds gauge",
+            "qrz_batch_start_time_seconds %.0f" % self.started,
+        ]
+        return "\n".join(lines) + "\n"
+
+    def writetextfile(self, filename):
+        # Replace the file atomically so the collector never reads a half written file
+        tempfilename = filename + ".tmp"
+        with open(tempfilename, 'w') as metricsfile:
+            metricsfile.write(self.render())
+        os.replace(tempfilename, filename)
+
+    def textfile(self, filename, interval=15.0):
+        # Rewrite filename every interval seconds until close()
+        def rewrite():
+            while not self.closing.wait(interval):
+                self.writetextfile(filename)
+
+        self.filename = filename
+        self.writetextfile(filename)
+        self.writer = threading.Thread(target=rewrite, name="qrz-metrics-textfile", daemon=True)
+        self.writer.start()
+
+    def serve(self, port, host="127.0.0.1"):
+        # Answer GET /metrics on host:port from a background thread until close()
+        metrics = self
+
+        class MetricsHandler(http.server.BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="qrz-metrics-http", daemon=True).start()
+
+    def close(self):
+        # Stop publishing; the textfile is left with the final values
+        self.closing.set()
+        if self.writer is not None:
+            self.writer.join()
+            self.writetextfile(self.filename)
+            self.writer = None
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
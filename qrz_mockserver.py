@@ -0,0 +1,236 @@
+import argparse
+import datetime
+import http.server
+import random
+import threading
+import time
+import urllib.parse
+import zlib
+from xml.sax.saxutils import escape
+from qrz_xml import qrz_tags
+
+# v1.01
+# Local stand-in for the QRZ Database XML Server (http://xmldata.qrz.com/xml/)
+# Answers logins and current/?s=...;callsign=... lookups with the same <Session>/<Callsign> XML the real server sends,
+# so the batch path can be tested and tuned offline without spending lookups from the daily quota.  Every callsign gets
+# a made-up record that is the same on every run.  Latency, HTTP errors, busy replies and expired sessions can be
+# injected at configurable rates.
+#
+#     python qrz_mockserver.py --port 8080 --latency 0.2 --error-rate 0.01 --timeout-rate 0.005
+#     python qrz_database_xml_server_search_extract_email_1-01.py --server http://127.0.0.1:8080/xml/
+
+xmlversion = "1.34"
+xmlheader = '<?xml version="1.0" encoding="utf-8" ?>\n<QRZDatabase version="' + xmlversion + \
+            '" xmlns="http://xmldata.qrz.com">\n'
+xmlfooter = '</QRZDatabase>\n'
+
+firstnames = ("John", "Mary", "José", "Zoë", "Björn", "Łukasz", "Anne-Marie", "Søren", "Hiroshi", "Dmitri", "Ana")
+lastnames = ("Smith", "Müller", "García", "O'Brien", "Núñez", "Kowalski", "Nguyen", "Åberg", "Tanaka", "Ivanov")
+states = ("CT", "TX", "CA", "NY", "FL", "OH", "WA", "AZ", "GA", "CO")
+countries = (("291", "United States"), ("1", "Canada"), ("223", "England"), ("230", "Fed. Rep. of Germany"),
+             ("339", "Japan"), ("281", "Spain"))
+classes = ("E", "G", "A", "T", "N")
+
+
+def gmtime():
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%a %b %d %H:%M:%S %Y")
+
+
+def mockrecord(callsign, rng=None, missing=0.2):
+    # A plausible <Callsign> field dictionary for callsign.  The same callsign always gets the same record unless
+    # rng is given.  About `missing` of the optional fields are left out, as the real server does.
+    if rng is None:
+        rng = random.Random(zlib.crc32(callsign.encode("utf-8")))
+    dxcc, land = rng.choice(countries)
+    fname = rng.choice(firstnames)
+    name = rng.choice(lastnames)
+    lat = rng.uniform(-60, 70)
+    lon = rng.uniform(-180, 180)
+    fields = {
+        "call": callsign, "aliases": "", "dxcc": dxcc, "fname": fname, "name": name,
+        "addr1": str(rng.randint(1, 9999)) + " Main St", "addr2": rng.choice(("Newington", "Springfield", "Köln")),
+        "state": rng.choice(states), "zip": "%05d" % rng.randint(501, 99950), "country": land, "ccode": dxcc,
+        "lat": "%.6f" % lat, "lon": "%.6f" % lon,
+        "grid": "FN31pr", "county": "Hartford", "fips": "%05d" % rng.randint(1001, 56045), "land": land,
+        "efdate": "2017-03-14", "expdate": "2027-03-14", "p_call": "", "class": rng.choice(classes), "codes": "HAI",
+        "qslmgr": "", "email": (fname + "." + callsign).lower().replace("/", "") + "@example.com",
+        "url": "https://www.qrz.com/db/" + callsign, "u_views": str(rng.randint(0, 500000)),
+        "bio": str(rng.randint(0, 20000)), "biodate": "2023-01-02 03:04:05",
+        "image": "https://cdn-xml.qrz.com/e/" + callsign.lower() + "/primary.jpg", "imageinfo": "285:500:44218",
+        "serial": str(rng.randint(1, 999999)), "moddate": "2024-05-06 07:08:09", "MSA": str(rng.randint(100, 9999)),
+        "AreaCode": str(rng.randint(201, 989)), "TimeZone": "Eastern", "GMTOffset": "-5", "DST": "Y",
+        "eqsl": rng.choice("01"), "mqsl": rng.choice("01"), "cqzone": str(rng.randint(1, 40)),
+        "ituzone": str(rng.randint(1, 90)), "born": str(rng.randint(1930, 2010)), "user": callsign,
+        "lotw": rng.choice("01"), "iota": "", "geoloc": rng.choice(("user", "geocode", "grid", "zip", "state")),
+    }
+    if rng.random() < 0.3:
+        fields["aliases"] = callsign + "/P," + "K" + callsign[1:]
+    if rng.random() < 0.1:
+        fields["p_call"] = "N" + callsign[1:]
+    for tag in qrz_tags[2:]:
+        if rng.random() < missing:
+            fields.pop(tag, None)
+    return {tag: value for tag, value in fields.items() if value}
+
+
+def mockresponse(session, callsign=None):
+    # The XML document for a <Session> dictionary and an optional <Callsign> dictionary, as bytes
+    parts = [xmlheader]
+    if callsign:
+        parts.append("<Callsign>\n")
+        parts.extend("<" + tag + ">" + escape(value) + "</" + tag + ">\n" for tag, value in callsign.items())
+        parts.append("</Callsign>\n")
+    parts.append("<Session>\n")
+    parts.extend("<" + tag + ">" + escape(value) + "</" + tag + ">\n" for tag, value in session.items())
+    parts.append("</Session>\n")
+    parts.append(xmlfooter)
+    return "".join(parts).encode("utf-8")
+
+
+class MockQRZServer(http.server.ThreadingHTTPServer):
+    # Serves the XML interface on (host, port).  The fault rates are fractions of requests (0 to 1).
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, jitter=0.0, errorrate=0.0, busyrate=0.0, timeoutrate=0.0,
+                 notfoundrate=0.05, sessionlifetime=None, password=None, seed=None):
+        super().__init__(address, MockQRZHandler)
+        self.latency = latency  # seconds added to every response
+        self.jitter = jitter  # up to this many seconds more, chosen at random
+        self.errorrate = errorrate  # requests answered with HTTP 503
+        self.busyrate = busyrate  # lookups answered with <Error>Too many requests, try again later</Error>
+        self.timeoutrate = timeoutrate  # lookups that expire the session key and answer "Session Timeout"
+        self.notfoundrate = notfoundrate  # callsigns that are "Not found" (the same ones on every run)
+        self.sessionlifetime = sessionlifetime  # seconds a session key stays valid, None for no limit
+        self.password = password  # the only password accepted, None to accept any
+        self.rng = random.Random(seed)
+        self.sessions = {}  # key -> (username, time issued)
+        self.counts = {}  # username -> lookups today
+        self.requests = 0
+        self.quiet = True  # no request log
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return "http://" + self.server_address[0] + ":" + str(self.server_address[1]) + "/xml/"
+
+    def chance(self, rate):
+        with self.lock:
+            return rate > 0 and self.rng.random() < rate
+
+    def delay(self):
+        # Sleep for the configured latency and return it - it is reported as the server's cpu time in <Remark>
+        with self.lock:
+            delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def login(self, args, cpu=0.0):
+        username = args.get("username", "")
+        if not username or (self.password is not None and args.get("password") != self.password):
+            return {"Error": "Username/password incorrect", "GMTime": gmtime()}
+        with self.lock:
+            key = "%032x" % self.rng.getrandbits(128)
+            self.sessions[key] = (username, time.monotonic())
+            count = self.counts.get(username, 0)
+        return {"Key": key, "Count": str(count), "SubExp": "Wed Jan 1 12:34:03 2031", "GMTime": gmtime(),
+                "Remark": "cpu: %.3fs" % cpu}
+
+    def lookup(self, args, cpu=0.0):
+        key = args.get("s", "")
+        callsign = args.get("callsign", "").strip().upper()
+        with self.lock:
+            session = self.sessions.get(key)
+            expired = session is not None and self.sessionlifetime is not None \
+                and time.monotonic() - session[1] > self.sessionlifetime
+            if expired:
+                del self.sessions[key]
+        if expired:
+            return {"Error": "Session Timeout", "GMTime": gmtime()}, None
+        if session is None:
+            return {"Error": "Invalid session key", "GMTime": gmtime()}, None
+        if self.chance(self.timeoutrate):
+            with self.lock:
+                self.sessions.pop(key, None)
+            return {"Error": "Session Timeout", "GMTime": gmtime()}, None
+        if self.chance(self.busyrate):
+            return {"Key": key, "Error": "Too many requests, try again later", "GMTime": gmtime()}, None
+
+        with self.lock:
+            count = self.counts[session[0]] = self.counts.get(session[0], 0) + 1
+        reply = {"Key": key, "Count": str(count), "SubExp": "Wed Jan 1 12:34:03 2031", "GMTime": gmtime(),
+                 "Remark": "cpu: %.3fs" % cpu}
+        if not callsign or zlib.crc32(callsign.encode("utf-8")) % 10000 < self.notfoundrate * 10000:
+            reply["Error"] = "Not found: " + callsign
+            return reply, None
+        return reply, mockrecord(callsign)
+
+
+class MockQRZHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, as xmldata.qrz.com
+    disable_nagle_algorithm = True  # headers and body are separate writes - don't hold the body for a delayed ACK
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+        cpu = server.delay()
+        if server.chance(server.errorrate):
+            self.reply(b"Service Unavailable", 503)
+            return
+
+        parts = urllib.parse.urlsplit(urllib.parse.unquote(self.path))
+        # QRZ separates query arguments with ';'
+        args = dict(arg.partition("=")[::2] for arg in parts.query.replace("&", ";").split(";") if arg)
+        if "callsign" in args:
+            session, callsign = server.lookup(args, cpu)
+        elif "username" in args:
+            session, callsign = server.login(args, cpu), None
+        else:
+            session, callsign = {"Error": "Invalid request", "GMTime": gmtime()}, None
+        self.reply(mockresponse(session, callsign))
+
+    def reply(self, body, status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/xml; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Local mock of the QRZ Database XML Server")
+    argparser.add_argument("--host", default="127.0.0.1")
+    argparser.add_argument("--port", type=int, default=8080)
+    argparser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    argparser.add_argument("--jitter", type=float, default=0.0, help="up to this many random seconds more")
+    argparser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with HTTP 503")
+    argparser.add_argument("--busy-rate", type=float, default=0.0,
+                           help="fraction of lookups answered with a \"too many requests\" <Error>")
+    argparser.add_argument("--timeout-rate", type=float, default=0.0,
+                           help="fraction of lookups that expire the session key")
+    argparser.add_argument("--notfound-rate", type=float, default=0.05, help="fraction of callsigns not found")
+    argparser.add_argument("--session-lifetime", type=float, help="seconds a session key stays valid")
+    argparser.add_argument("--password", help="only accept this password (default: any)")
+    argparser.add_argument("--seed", type=int, help="random seed for the injected faults")
+    argparser.add_argument("--verbose", action="store_true", help="log every request")
+    args = argparser.parse_args()
+
+    server = MockQRZServer((args.host, args.port), args.latency, args.jitter, args.error_rate, args.busy_rate,
+                           args.timeout_rate, args.notfound_rate, args.session_lifetime, args.password, args.seed)
+    server.quiet = not args.verbose
+    print("Mock QRZ Database XML Server at " + server.url + " (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    print("Answered {} requests".format(server.requests))
+
+
+if __name__ == "__main__":
+    main()
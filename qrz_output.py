@@ -0,0 +1,189 @@
+import json
+import sys
+import time
+import qrz_batch
+from qrz_xml import qrz_tags, qrz_labels
+
+# v1.01
+# Output sinks for the email extractor
+# The extractor hands every processed callsign to one sink instead of printing each field as it is parsed.  A sink
+# renders the whole record and writes it at most once, so a batch of thousands is not throttled by console I/O:
+#
+#     console   the full record, field by field, as the search scripts have always shown it
+#     progress  a single status line rewritten in place a few times a second
+#     jsonl     one JSON object per callsign on stdout, for piping into other tools
+#     silent    nothing but errors
+#
+# The sink is made before anything is shown: message() carries the banner, the startup notes and the run summary,
+# error() fatal errors and prompt() the questions asked of the user.  Sinks whose stdout is machine readable send all
+# three to stderr instead, and silent drops the messages.  begin() is called once the callsigns to process are known.
+
+sinks = ("console", "progress", "jsonl", "silent")
+
+
+class ConsoleOutput:
+
+    def __init__(self, servername, cachename, key="", stream=None):
+        self.servername = servername
+        self.cachename = cachename
+        self.stream = sys.stdout if stream is None else stream
+        self.key = key  # last session key shown, to report when the server hands out a new one
+
+    def begin(self, total, key=""):
+        self.key = key
+
+    def record(self, callsign, response, status, saved):
+        session, fields = response.session, response.callsign
+        lines = ["\n"]
+        if response.cached:
+            lines.append("Record retrieved from local cache " + self.cachename + "...")
+        elif response.database:
+            lines.append("Connected to " + self.servername + "...")
+            lines.append("Captured XML is " + str(response.nbytes) + " bytes long.")
+            lines.append("Session Timestamp:> " + session.get("GMTime", "") + " GMT")
+        if "Remark" in session:
+            lines.append("QRZ Database Remark:> \"" + session["Remark"] + "\"")
+        if "Error" in session:
+            lines.append("QRZ Database Error:> " + session["Error"])
+        else:
+            if "Count" in session:
+                lines.append("You have used this service " + session["Count"] + " times today.")
+            if "SubExp" in session:
+                lines.append("Subscription expires:> " + session["SubExp"])
+            if "Key" in session:
+                lines.append("Your session key:> " + session["Key"])
+                if session["Key"] != self.key:
+                    lines.append("*** Session key saved...\n")
+                    self.key = session["Key"]
+            lines.extend(label + ": " + fields[tag] for tag, label in zip(qrz_tags, qrz_labels)
+                         if tag in fields and tag != "email")
+            # email address is shown last - it is what decides whether the record goes to the csv file
+            if "email" in fields:
+                lines.append("Email Address: " + fields["email"])
+            if saved:
+                lines.append("\n*** Callsign saved to csv file...\n")
+        self.stream.write("\n".join(lines) + "\n")
+
+    def message(self, text):
+        self.stream.write(text + "\n")
+
+    def error(self, text):
+        self.stream.write(text + "\n")
+        self.stream.flush()
+
+    def prompt(self, text):
+        self.stream.flush()
+        return input(text)
+
+    def close(self):
+        self.stream.flush()
+
+
+class ProgressOutput:
+
+    def __init__(self, total=0, interval=0.25, stream=None):
+        self.total = total  # callsigns to be processed
+        self.interval = interval  # seconds between redraws
+        self.stream = sys.stdout if stream is None else stream
+        self.count = 0
+        self.saved = 0
+        self.notfound = 0
+        self.started = time.monotonic()
+        self.drawn = 0.0
+        self.width = 0
+
+    def begin(self, total, key=""):
+        self.total = total
+        self.started = time.monotonic()
+
+    def record(self, callsign, response, status, saved):
+        self.count += 1
+        self.saved += saved
+        self.notfound += status == qrz_batch.notfound
+        now = time.monotonic()
+        if now - self.drawn >= self.interval or self.count == self.total:
+            self.draw(callsign, now)
+
+    def draw(self, callsign, now):
+        elapsed = max(now - self.started, 1e-9)
+        line = "{}/{} {:<10} {:.1f}/s  saved {}  not found {}".format(self.count, self.total, callsign,
+                                                                       self.count / elapsed, self.saved,
+                                                                       self.notfound)
+        self.stream.write("\r" + line.ljust(self.width))
+        self.stream.flush()
+        self.width = len(line)
+        self.drawn = now
+
+    def message(self, text):
+        self.clear()
+        self.stream.write(text + "\n")
+
+    def error(self, text):
+        self.message(text)
+        self.stream.flush()
+
+    def prompt(self, text):
+        self.clear()
+        self.stream.flush()
+        return input(text)
+
+    def clear(self):
+        if self.width:
+            self.stream.write("\n")
+            self.width = 0
+
+    def close(self):
+        self.clear()
+        self.stream.flush()
+
+
+class JSONLOutput:
+    # {"callsign": ..., "status": ..., "saved": ..., "cached": ..., "session": {...}, "record": {...}} per line.
+    # The session key is left out.
+
+    def __init__(self, stream=None):
+        self.stream = sys.stdout if stream is None else stream
+
+    def begin(self, total, key=""):
+        pass
+
+    def record(self, callsign, response, status, saved):
+        session = {tag: value for tag, value in response.session.items() if tag != "Key"}
+        self.stream.write(json.dumps({"callsign": callsign, "status": status, "saved": bool(saved),
+                                      "cached": response.cached, "session": session, "record": response.callsign},
+                                     ensure_ascii=False) + "\n")
+
+    def message(self, text):
+        sys.stderr.write(text + "\n")
+
+    def error(self, text):
+        sys.stderr.write(text + "\n")
+        sys.stderr.flush()
+
+    def prompt(self, text):
+        sys.stderr.write(text)
+        sys.stderr.flush()
+        return input()
+
+    def close(self):
+        self.stream.flush()
+
+
+class SilentOutput(JSONLOutput):
+
+    def record(self, callsign, response, status, saved):
+        pass
+
+    def message(self, text):
+        pass
+
+
+def makeoutput(sink, servername, cachename):
+    # The sink named by --output
+    if sink == "progress":
+        return ProgressOutput()
+    if sink == "jsonl":
+        return JSONLOutput()
+    if sink == "silent":
+        return SilentOutput()
+    return ConsoleOutput(servername, cachename)
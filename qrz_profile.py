@@ -0,0 +1,82 @@
+import atexit
+import cProfile
+import io
+import pstats
+import sys
+import threading
+
+# v1.01
+# Built-in cProfile mode for the search scripts and fcc_api.py
+# startprofile() profiles the rest of the run and registers an atexit handler that writes the raw profile (for
+# snakeviz, gprof2dot or pstats) and prints the top hotspots by own time and by cumulative time, so it also works
+# when a script ends with exit().  Nothing is imported or hooked unless --profile is given.
+# Before Python 3.12 cProfile only sees the thread that enabled it, so every worker thread started afterwards gets a
+# profiler of its own and the results are merged.
+
+profilefilename = "qrz.prof"
+profiletop = 25
+
+
+def profileoptions(argv=None, filename=profilefilename):
+    # (filename, top) from --profile[=FILE] and --profile-top=N in argv (for scripts without argparse), or None
+    argv = sys.argv[1:] if argv is None else argv
+    profile = None
+    top = profiletop
+    for arg in argv:
+        if arg == "--profile":
+            profile = filename
+        elif arg.startswith("--profile="):
+            profile = arg.split("=", 1)[1] or filename
+        elif arg.startswith("--profile-top="):
+            top = int(arg.split("=", 1)[1])
+    if profile is None:
+        return None
+    return profile, top
+
+
+def startprofile(filename=profilefilename, top=profiletop, stream=None):
+    profilers = [cProfile.Profile()]
+    lock = threading.Lock()
+
+    def threadprofile(frame, event, arg):
+        # First event in a new thread: give the thread its own profiler
+        profiler = cProfile.Profile()
+        with lock:
+            profilers.append(profiler)
+        profiler.enable()
+
+    if sys.version_info < (3, 12):
+        threading.setprofile(threadprofile)
+    atexit.register(stopprofile, profilers, filename, top, stream)
+    profilers[0].enable()
+    return profilers[0]
+
+
+def stopprofile(profilers, filename, top, stream=None):
+    stream = sys.stdout if stream is None else stream
+    threading.setprofile(None)
+    profilers[0].disable()
+    stats = None
+    for profiler in profilers:
+        profiler.create_stats()
+        if not profiler.stats:
+            continue
+        if stats is None:
+            stats = pstats.Stats(profiler, stream=io.StringIO())
+        else:
+            stats.add(profiler)
+    if stats is None:
+        return
+    stats.dump_stats(filename)
+
+    for order, title in (("tottime", "own time"), ("cumulative", "cumulative time")):
+        report = io.StringIO()
+        stats.stream = report
+        stats.sort_stats(order).print_stats(top)
+        # Skip pstats' preamble down to the column headings
+        lines = report.getvalue().splitlines()
+        start = next((number for number, line in enumerate(lines) if line.lstrip().startswith("ncalls")), 0)
+        print("\n*** Top {} functions by {}:".format(top, title), file=stream)
+        print("\n".join(line for line in lines[start:] if line.strip()), file=stream)
+    print("\n*** Profile saved to {} ({} threads) - view it with: python -m pstats {}".format(
+        filename, len(profilers), filename), file=stream)
@@ -0,0 +1,107 @@
+import datetime
+import http.client
+import random
+import threading
+import time
+
+# v1.01
+# Quota-aware request pacing for the QRZ Database XML Server
+# Every response carries <Count> (lookups made today).  RateLimiter spaces requests out with a token bucket, slows down
+# further so the rest of a daily budget lasts until the count resets at 00:00 GMT, and when the server signals
+# overload it pauses every worker for a jittered, exponentially growing delay.
+
+# <Error> messages and HTTP status codes that mean "slow down" rather than "this lookup failed" (lower case)
+overloaderrors = ("too many", "busy", "overload", "try again", "rate limit", "connection refused")
+overloadstatus = (429, 502, 503, 504)
+
+
+def overloaded(response):
+    if response.status in overloadstatus:
+        return True
+    msg = response.session.get("Error", "").lower()
+    return any(error in msg for error in overloaderrors)
+
+
+def secondstoreset():
+    # Seconds until the daily lookup count resets at midnight GMT
+    now = datetime.datetime.now(datetime.timezone.utc)
+    midnight = (now + datetime.timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (midnight - now).total_seconds()
+
+
+class RateLimiter:
+
+    def __init__(self, rate=5.0, burst=1, dailylimit=None, retries=4, backoff=1.0, maxbackoff=60.0):
+        self.rate = rate  # most requests per second, None or 0 for no limit
+        self.burst = burst  # requests allowed back to back before pacing starts
+        self.dailylimit = dailylimit  # most lookups per day according to <Count>, None for no limit
+        self.retries = retries  # retries after an overload signal or connection error
+        self.backoff = backoff  # first backoff delay in seconds, doubled on each retry
+        self.maxbackoff = maxbackoff
+        self.count = None  # latest <Count> from the server
+        self.used = 0  # lookups made today: <Count> plus requests sent since it was read
+        self.tat = 0.0  # theoretical arrival time of the next request (GCRA form of the token bucket)
+        self.pauseuntil = 0.0  # no request may start before this time
+        self.backoffs = 0
+        self.lock = threading.Lock()
+
+    def currentrate(self):
+        # The configured rate, lowered so the remaining daily budget lasts until the count resets
+        rate = self.rate or 0
+        if self.dailylimit is not None:
+            remaining = self.dailylimit - self.used
+            if remaining <= 0:
+                self.pauseuntil = max(self.pauseuntil, time.monotonic() + secondstoreset())
+                self.used = 0
+                return rate
+            budgetrate = remaining / secondstoreset()
+            rate = min(rate, budgetrate) if rate else budgetrate
+        return rate
+
+    def acquire(self):
+        # Block until the next request may be sent
+        with self.lock:
+            now = time.monotonic()
+            rate = self.currentrate()
+            start = max(now, self.pauseuntil)
+            if rate:
+                interval = 1.0 / rate
+                tat = max(self.tat, start)
+                start = max(start, tat - (self.burst - 1) * interval)
+                self.tat = tat + interval
+            self.used += 1
+        if start > now:
+            time.sleep(start - now)
+
+    def observe(self, response):
+        # Read <Count> from a response
+        with self.lock:
+            if "Count" in response.session:
+                try:
+                    self.count = int(response.session["Count"])
+                    self.used = max(self.used, self.count)
+                except ValueError:
+                    pass
+
+    def pause(self, attempt):
+        # Hold back every worker for a jittered exponential delay
+        delay = min(self.maxbackoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.5)
+        with self.lock:
+            self.pauseuntil = max(self.pauseuntil, time.monotonic() + delay)
+            self.backoffs += 1
+
+    def request(self, fetch, url):
+        # Call fetch(url) when the limiter allows, backing off and retrying while the server signals overload
+        for attempt in range(self.retries + 1):
+            self.acquire()
+            try:
+                response = fetch(url)
+            except (OSError, http.client.HTTPException):
+                if attempt == self.retries:
+                    raise
+                self.pause(attempt)
+                continue
+            self.observe(response)
+            if attempt == self.retries or not overloaded(response):
+                return response
+            self.pause(attempt)
@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+from os import path
+
+# v1.01
+# Session key lifecycle for the QRZ Database XML Server
+# From the spec: "clients should expect to perform only one login operation per session ... All clients should monitor
+# the status response returned in each transaction and be prepared to login again whenever indicated."
+# SessionManager keeps the current key, saves every new key to qrz.key, and when a lookup comes back with an expired
+# or invalid key it logs in again with the credentials it was given the first time and retries the lookup.  A retry
+# that meets an expired key again is retried with the next key as long as logins keep bringing new ones: keys another
+# worker has already replaced are simply retried with the current one, and a lookup gives up after logging in retries
+# times itself.
+
+# <Error> messages that mean the session key has to be replaced (compared in lower case)
+sessionerrors = ("session timeout", "invalid session key", "session does not exist", "session expired")
+
+
+def sessionerror(response):
+    # True if the response's <Error> says the session key is no longer valid
+    msg = response.session.get("Error", "").lower()
+    return any(error in msg for error in sessionerrors)
+
+
+class SessionManager:
+
+    def __init__(self, baseurl, fetch, login, keyfilename="qrz.key"):
+        self.baseurl = baseurl
+        self.fetch = fetch  # fetch(url) returns a parsed response, i.e. getxml()
+        self.login = login  # login() returns the login URL with the username and password, i.e. qrzlogin()
+        self.keyfilename = keyfilename
+        self.loginurl = None  # remembered after the first login so later logins do not prompt again
+        self.key = ""
+        self.logins = 0
+        self.retries = 3  # logins one lookup may make before its session error is returned to the caller
+        self.timer = None  # qrz_timing.StageTimer to time the URL build
+        self.lock = threading.RLock()
+
+    def loadkey(self):
+        # Read the saved session key.  Returns False if there is no key file.
+        if not path.exists(self.keyfilename):
+            return False
+        with open(self.keyfilename, 'r') as keyfile:
+            self.key = keyfile.read().strip()
+        return True
+
+    def savekey(self, key):
+        # Replace qrz.key atomically so an interrupted write never leaves a truncated key behind
+        tempfilename = self.keyfilename + ".tmp"
+        with open(tempfilename, 'w') as keyfile:
+            keyfile.write(key)
+        os.replace(tempfilename, self.keyfilename)
+
+    def update(self, response):
+        # Keep and save the key carried by a response if it differs from the current one
+        key = response.session.get("Key")
+        if key:
+            with self.lock:
+                if key != self.key:
+                    self.key = key
+                    self.savekey(key)
+
+    def newsession(self):
+        # Log in and return the login response
+        with self.lock:
+            if self.loginurl is None:
+                self.loginurl = self.login()
+            response = self.fetch(self.loginurl)
+            self.logins += 1
+            self.update(response)
+            return response
+
+    def relogin(self, oldkey):
+        # Log in again unless another thread already replaced oldkey while this one was waiting.  Returns True if
+        # this call logged in.
+        with self.lock:
+            if self.key != oldkey:
+                return False
+            self.newsession()
+            return True
+
+    def lookup(self, callsign):
+        # Look up callsign; while the key has expired, log in again and retry as long as each login brings a new key
+        key = self.key
+        if self.timer is not None:
+            started = time.perf_counter()
+            url = self.baseurl + "current/?s=" + key + ";callsign=" + callsign
+            self.timer.record("url", time.perf_counter() - started)
+        else:
+            url = self.baseurl + "current/?s=" + key + ";callsign=" + callsign
+        response = self.fetch(url)
+        logins = 0
+        while sessionerror(response) and logins < self.retries:
+            if self.relogin(key):
+                logins += 1
+            if self.key == key:
+                break  # the login brought no new key - report the error
+            key = self.key
+            response = self.fetch(self.baseurl + "current/?s=" + key + ";callsign=" + callsign)
+        # A reply echoing the key it was sent with must not bring back a key another worker has already replaced
+        if response.session.get("Key") != key:
+            self.update(response)
+        return response
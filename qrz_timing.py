@@ -0,0 +1,107 @@
+import bisect
+import re
+import sys
+import threading
+
+# v1.01
+# Per-stage timing of QRZ lookups
+# A StageTimer is handed to ConnectionPool, SessionManager and readresponse() (their .timer attribute or timer argument,
+# None by default so nothing is timed) and collects a histogram of the time spent in each stage of a lookup:
+#
+#     url         building the lookup URL
+#     connect     opening a new connection (reused keep-alive connections skip this)
+#     first byte  sending the request until the status line and headers arrive
+#     body read   reading the response body from the socket
+#     parse       feeding the body to the XML parser
+#     server cpu  the server's own time, from <Remark>cpu: 0.023s</Remark>
+#     network     first byte less server cpu - time spent on the wire and in queues
+#     csv write   handing the record to the CSV writer
+#     console     printing the record
+#
+# report() prints count, mean, approximate p50/p95 (bucket upper bounds), max and a bar chart of each histogram.
+
+stages = ("url", "connect", "first byte", "body read", "parse", "server cpu", "network", "csv write", "console")
+
+# Histogram bucket upper bounds in seconds; the last bucket holds everything slower
+bounds = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+remarkpattern = re.compile(r"cpu:\s*([0-9.]+)\s*s")
+
+
+def servercpu(response):
+    # Seconds of server CPU time reported in the response's <Remark>, or None
+    match = remarkpattern.search(response.session.get("Remark", ""))
+    if match is None:
+        return None
+    try:
+        return float(match.group(1))
+    except ValueError:
+        return None
+
+
+def formatseconds(seconds):
+    if seconds >= 1:
+        return "{:.2f}s".format(seconds)
+    if seconds >= 0.001:
+        return "{:.1f}ms".format(seconds * 1000)
+    return "{:.0f}us".format(seconds * 1000000)
+
+
+class StageTimer:
+
+    def __init__(self):
+        self.counts = {}  # stage -> list of bucket counts
+        self.totals = {}  # stage -> total seconds
+        self.maxima = {}  # stage -> slowest sample
+        self.lock = threading.Lock()  # stages are recorded from worker threads
+
+    def record(self, stage, seconds):
+        bucket = bisect.bisect_left(bounds, seconds)
+        with self.lock:
+            counts = self.counts.get(stage)
+            if counts is None:
+                counts = self.counts[stage] = [0] * (len(bounds) + 1)
+                self.totals[stage] = 0.0
+                self.maxima[stage] = 0.0
+            counts[bucket] += 1
+            self.totals[stage] += seconds
+            if seconds > self.maxima[stage]:
+                self.maxima[stage] = seconds
+
+    def percentile(self, stage, fraction):
+        # Upper bound of the bucket holding the given fraction of the samples
+        counts = self.counts[stage]
+        wanted = fraction * sum(counts)
+        seen = 0
+        for bucket, count in enumerate(counts):
+            seen += count
+            if seen >= wanted and count:
+                return bounds[bucket] if bucket < len(bounds) else self.maxima[stage]
+        return self.maxima[stage]
+
+    def report(self, stream=None):
+        stream = sys.stdout if stream is None else stream
+        with self.lock:
+            recorded = [stage for stage in stages if stage in self.counts]
+            recorded += [stage for stage in self.counts if stage not in stages]
+            if not recorded:
+                return
+            print("\nTime per lookup stage (p50 and p95 are histogram bucket bounds):", file=stream)
+            print("{:<11} {:>7} {:>9} {:>9} {:>9} {:>9} {:>9}".format("stage", "count", "total", "mean", "p50",
+                                                                      "p95", "max"), file=stream)
+            for stage in recorded:
+                count = sum(self.counts[stage])
+                print("{:<11} {:>7} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+                    stage, count, formatseconds(self.totals[stage]), formatseconds(self.totals[stage] / count),
+                    "<" + formatseconds(self.percentile(stage, 0.5)), "<" + formatseconds(self.percentile(stage, 0.95)),
+                    formatseconds(self.maxima[stage])), file=stream)
+            for stage in recorded:
+                counts = self.counts[stage]
+                largest = max(counts)
+                print("\n" + stage + ":", file=stream)
+                for bucket, count in enumerate(counts):
+                    if count:
+                        label = "<" + formatseconds(bounds[bucket]) if bucket < len(bounds) \
+                            else ">=" + formatseconds(bounds[-1])
+                        print("  {:>8} {:>7} {}".format(label, count, "#" * max(1, count * 40 // largest)),
+                              file=stream)
@@ -0,0 +1,225 @@
+import operator
+import time
+from xml.parsers import expat
+
+# v1.01
+# Shared parsing helpers for the QRZ Database XML Server search scripts
+
+# QRZ Database XML tags, in the same order as the qrz_fields header labels used by the search scripts.
+# "class" and "codes" are stored as license_class and license_codes because class is a Python reserved word.
+qrz_tags = ("call", "xref", "aliases", "dxcc", "fname", "name", "addr1", "addr2", "state", "zip", "country", "ccode",
+            "lat", "lon", "grid", "county", "fips", "land", "efdate", "expdate", "p_call", "class", "codes", "qslmgr",
+            "email", "url", "u_views", "bio", "biodate", "image", "imageinfo", "serial", "moddate", "MSA", "AreaCode",
+            "TimeZone", "GMTOffset", "DST", "eqsl", "mqsl", "cqzone", "ituzone", "born", "user", "lotw", "iota",
+            "geoloc")
+
+# QRZRecord attribute names: the qrz_tags with class and codes renamed as in the search scripts
+qrz_attrs = tuple({"class": "license_class", "codes": "license_codes"}.get(tag, tag) for tag in qrz_tags)
+qrz_tagattrs = dict(zip(qrz_tags, qrz_attrs))
+
+# Console labels for each of the qrz_tags
+qrz_labels = ("Callsign", "Cross Reference", "Aliases", "DXCC Entity ID", "First Name", "Last Name", "Address Line 1",
+              "Address Line 2", "State", "ZIP Code", "Country", "DXCC Entity Code", "Latitude", "Longitude",
+              "Grid Locator", "County", "FIPS", "DXCC Country", "License Effective Date", "License Expiration Date",
+              "Previous Callsign", "License Class", "License Type Codes", "QSL Manager", "Email Address",
+              "QRZ webpage URL", "QRZ webpage views", "QRZ Biography length (bytes)", "QRZ Biography last update",
+              "Image URL", "Image specifications (height:width:bytes)", "QRZ Database Serial #",
+              "QRZ callsign last modified date", "USPS Metro Service Area", "Telephone Area Code", "Time Zone",
+              "GMT Offset", "Observes Daylight Savings Time", "Accepts eQSL", "Returns paper QSL", "CQ Zone Identifier",
+              "ITU Zone Identifier", "Year of Birth", "QRZ Database Record Manager", "Accepts LOTW", "IOTA Designator",
+              "Source of Lat/Long")
+
+# Child nodes of <Session> returned with every response
+session_tags = ("Key", "Count", "SubExp", "GMTime", "Message", "Error", "Remark")
+
+# Bytes read from the HTTP response per expat feed
+chunksize = 8192
+
+# * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * *
+# *                                                                 *
+# *                          Functions                              *
+# *                                                                 *
+# * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * *
+
+class QRZRecord:
+    # One <Callsign> record in qrz_tags order.  Fields the server did not return are empty strings.
+    # __slots__ keeps each record to a single small object, so hundreds of thousands of them can be held for
+    # dedup and analysis, and a new record is built for every response so no value carries over from the last one.
+    #
+    # call              callsign
+    # xref              Cross reference: the query callsign that returned this record
+    # aliases           Other callsigns that resolve to this record
+    # dxcc              DXCC entity ID (country code for the callsign)
+    # fname, name       first name, last name
+    # addr1, addr2      address line 1 (i.e. house # and street), address line 2 (i.e. city name)
+    # state, zip        state (USA only), Zip/postal code
+    # country, ccode    country name and DXCC entity code for the QSL mailing address
+    # lat, lon          latitude, longitude of address (signed decimal) S < 0 > N, W < 0 > E
+    # grid              grid locator
+    # county, fips      county name and FIPS county identifier (USA)
+    # land              DXCC country name of the callsign
+    # efdate, expdate   license effective and expiration dates (USA)
+    # p_call            previous callsign
+    # license_class     "<class>" license class
+    # license_codes     "<codes>" license type codes (USA)
+    # qslmgr, email     QSL manager info, email address
+    # url, u_views      web page address, QRZ web page views
+    # bio, biodate      approximate length of the bio HTML in bytes, date of the last bio update
+    # image, imageinfo  full URL of the callsign's primary image, height:width:size in bytes of the image file
+    # serial, moddate   QRZ database serial number, QRZ callsign last modified date
+    # MSA, AreaCode     Metro Service Area (USPS), Telephone Area Code (USA)
+    # TimeZone, GMTOffset, DST   Time Zone (USA), GMT Time Offset, Daylight Savings Time Observed
+    # eqsl, mqsl, lotw  Will accept e-qsl / return paper QSL / accept LOTW (0/1 or blank if unknown)
+    # cqzone, ituzone   CQ and ITU Zone identifiers
+    # born, user        operator's year of birth, User who manages this callsign on QRZ
+    # iota, geoloc      IOTA Designator (blank if unknown), Describes source of lat/long data
+
+    __slots__ = qrz_attrs
+
+    def __init__(self, *values):
+        for attr in qrz_attrs:
+            setattr(self, attr, "")
+        for attr, value in zip(qrz_attrs, values):
+            setattr(self, attr, value)
+
+    @classmethod
+    def fromfields(cls, fields):
+        # Build a record from a tag -> value dictionary such as ResponseParser.callsign
+        record = cls.__new__(cls)
+        get = fields.get
+        for attr, tag in zip(qrz_attrs, qrz_tags):
+            setattr(record, attr, get(tag, ""))
+        return record
+
+    def row(self):
+        # Values in qrz_tags order, ready for csv.writer.writerow()
+        return list(rowgetter(self))
+
+    def asdict(self):
+        # Values keyed by XML tag name
+        return dict(zip(qrz_tags, rowgetter(self)))
+
+    def __iter__(self):
+        return iter(rowgetter(self))
+
+    def __eq__(self, other):
+        return isinstance(other, QRZRecord) and rowgetter(self) == rowgetter(other)
+
+    def __hash__(self):
+        # Records are compared by value, so equal records can be collapsed in a set or used as dictionary keys
+        return hash(rowgetter(self))
+
+    def __repr__(self):
+        return "QRZRecord(" + ", ".join(attr + "=" + repr(getattr(self, attr)) for attr in qrz_attrs
+                                        if getattr(self, attr)) + ")"
+
+
+rowgetter = operator.attrgetter(*qrz_attrs)
+
+
+class ResponseParser:
+    # Incremental parser for the raw bytes of a QRZ response.  Bytes are handed to expat as they arrive, so UTF-8 is
+    # decoded correctly (accented names survive) without ever holding a decoded copy of the whole document.
+
+    def __init__(self):
+        self.database = False  # True once the <QRZDatabase> root element has been seen
+        self.nbytes = 0  # number of response bytes consumed so far
+        self.status = None  # HTTP status code, filled in by the caller that made the request
+        self.failed = False  # True if the reply was not well-formed XML (i.e. an HTML error page)
+        self.cached = False  # True if the record came from a local cache instead of the server
+        self.session = {}
+        self.callsign = {}
+        self.qrzrecord = None  # QRZRecord filled in field by field while <Callsign> is parsed
+        self.section = None
+        self.field = None
+        self.text = []
+        self.parser = expat.ParserCreate()
+        self.parser.buffer_text = True
+        self.parser.StartElementHandler = self.start
+        self.parser.EndElementHandler = self.end
+        self.parser.CharacterDataHandler = self.data
+
+    def start(self, tag, attrs):
+        if tag == "QRZDatabase":
+            self.database = True
+        elif tag == "Session":
+            self.section = self.session
+        elif tag == "Callsign":
+            self.section = self.callsign
+            self.qrzrecord = QRZRecord()
+        elif self.section is not None:
+            self.field = tag
+            self.text = []
+
+    def end(self, tag):
+        if tag == self.field:
+            value = self.section[tag] = "".join(self.text)
+            if self.section is self.callsign and tag in qrz_tagattrs:
+                setattr(self.qrzrecord, qrz_tagattrs[tag], value)
+            self.field = None
+        elif tag == "Session" or tag == "Callsign":
+            self.section = None
+
+    def data(self, text):
+        if self.field is not None:
+            self.text.append(text)
+
+    def feed(self, data, final=False):
+        # Parse the next chunk of bytes
+        # A truncated or non-XML reply stops the parse and leaves whatever was read before the error.
+        self.nbytes += len(data)
+        if not self.failed:
+            try:
+                self.parser.Parse(data, final)
+            except expat.ExpatError:
+                self.failed = True
+
+    def close(self):
+        self.feed(b"", True)
+
+    def record(self):
+        # The <Callsign> element as a QRZRecord.  The parser fills it in as each field closes; responses that were
+        # not parsed (cachedresponse()) build it from their fields.
+        if self.qrzrecord is None:
+            return QRZRecord.fromfields(self.callsign)
+        return self.qrzrecord
+
+
+def readresponse(stream, timer=None):
+    # Read and parse a complete response.  Returns the ResponseParser so callers can check .database and .nbytes as
+    # well as the .session and .callsign dictionaries.  With a qrz_timing.StageTimer, the time spent reading the body
+    # and the time spent parsing it are recorded separately.
+    parser = ResponseParser()
+    if timer is not None:
+        reading = parsing = 0.0
+        while True:
+            started = time.perf_counter()
+            data = stream.read(chunksize)
+            read = time.perf_counter()
+            reading += read - started
+            if not data:
+                break
+            parser.feed(data)
+            parsing += time.perf_counter() - read
+        started = time.perf_counter()
+        parser.close()
+        timer.record("body read", reading)
+        timer.record("parse", parsing + time.perf_counter() - started)
+        return parser
+    while True:
+        data = stream.read(chunksize)
+        if not data:
+            break
+        parser.feed(data)
+    parser.close()
+    return parser
+
+
+def cachedresponse(fields):
+    # Build a ResponseParser holding <Callsign> fields that came from a local cache.  It has no <Session>, so a
+    # cached record never carries an old session key or count.
+    response = ResponseParser()
+    response.database = True
+    response.cached = True
+    response.callsign = fields
+    return response